@@ -0,0 +1,4 @@
+"""Бенчмарки горячих путей API и Celery на сгенерированных данных.
+
+Запуск: python manage.py benchmark --profiles 200 --tasks 50000 --output result.json
+"""
@@ -0,0 +1,133 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegramServer:
+    """Локальная имитация Telegram Bot API для нагрузочных тестов уведомлений.
+
+    Записывает все sendMessage, умеет добавлять задержку, отвечать 429
+    (с retry_after) и 500 с заданной вероятностью.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, jitter_ms=0,
+                 rate_limit_ratio=0.0, error_ratio=0.0, retry_after=1, random_seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.error_ratio = error_ratio
+        self.retry_after = retry_after
+        self.messages = []
+        self.stats = {'requests': 0, 'delivered': 0, 'rate_limited': 0, 'errors': 0}
+        self._random = random.Random(random_seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle(self, method, payload):
+        """Ответ на вызов метода Bot API: (HTTP-статус, тело)"""
+        delay = self.latency_ms + (self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        with self._lock:
+            self.stats['requests'] += 1
+            roll = self._random.random()
+            if roll < self.rate_limit_ratio:
+                self.stats['rate_limited'] += 1
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after},
+                }
+            if roll < self.rate_limit_ratio + self.error_ratio:
+                self.stats['errors'] += 1
+                return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+            if method != 'sendMessage':
+                return 200, {'ok': True, 'result': True}
+            self.stats['delivered'] += 1
+            message_id = len(self.messages) + 1
+            self.messages.append({
+                'message_id': message_id,
+                'chat_id': payload.get('chat_id'),
+                'text': payload.get('text'),
+                'received_at': time.time(),
+            })
+        return 200, {
+            'ok': True,
+            'result': {'message_id': message_id, 'chat': {'id': payload.get('chat_id')}, 'text': payload.get('text')},
+        }
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    payload = {}
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                status, body = fake._handle(method, payload)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Telegram Bot API server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--rate-limit-ratio', type=float, default=0)
+    parser.add_argument('--error-ratio', type=float, default=0)
+    args = parser.parse_args()
+    server = FakeTelegramServer(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        rate_limit_ratio=args.rate_limit_ratio, error_ratio=args.error_ratio,
+    )
+    print(f'Fake Telegram Bot API listening on {server.url} (set TELEGRAM_API_URL to this address)')
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats))
+
+
+if __name__ == '__main__':
+    main()
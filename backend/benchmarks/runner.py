@@ -0,0 +1,74 @@
+import contextlib
+import statistics
+import time
+from types import SimpleNamespace
+from unittest import mock
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from .scenarios import SCENARIOS
+
+
+@contextlib.contextmanager
+def benchmark_database(keepdb=False):
+    """Отдельная тестовая БД и кэш в памяти: бенчмарк не трогает боевые данные и Redis"""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            # Сценарии не должны публиковать события в Redis и упираться в лимиты запросов
+            with mock.patch('tasks.events._publish', lambda events: None), \
+                    mock.patch('tasks.throttling.RedisRateThrottle.allow_request', lambda self, request, view: True):
+                yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(dataset, names=None, repeat=5):
+    """Прогнать сценарии: время (мс), число SQL-запросов и размер ответа"""
+    ctx = SimpleNamespace(client=APIClient(), dataset=dataset)
+    results = {}
+    for name in names or SCENARIOS:
+        func = SCENARIOS[name]
+        func(ctx)  # прогрев
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                size = func(ctx)
+                timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'min_ms': round(min(timings), 3),
+            'queries': len(queries),
+        }
+        if size is not None:
+            results[name]['bytes'] = size
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Сравнить с базовым прогоном: регрессия - рост медианы больше threshold или рост числа запросов"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = current['median_ms'] / previous['median_ms'] if previous['median_ms'] else 1
+        current['baseline_median_ms'] = previous['median_ms']
+        current['ratio'] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: median {previous['median_ms']}ms -> {current['median_ms']}ms (x{ratio:.2f})")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
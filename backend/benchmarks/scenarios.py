@@ -0,0 +1,373 @@
+from unittest import mock
+from django.core.cache import cache
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Регистрация сценария. Функция получает контекст запуска и может вернуть размер ответа в байтах."""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def _get(ctx, url):
+    response = ctx.client.get(url)
+    assert response.status_code == 200, f'{url}: {response.status_code}'
+    return len(response.content)
+
+
+@scenario('task_list')
+def task_list(ctx):
+    # Холодный кэш: измеряем запросы к БД и сериализацию
+    cache.clear()
+    return _get(ctx, f"/api/tasks/?telegram_id={ctx.dataset['telegram_id']}")
+
+
+# Размер ответа и время списка задач в зависимости от набора полей (?fields=)
+FIELD_SETS = {
+    'minimal': 'id,title,due_date',
+    'bot': 'id,title,description,created_at,due_date,category_names',
+    'no_user_info': None,
+}
+
+
+def _field_set_scenario(name, fields):
+    def run(ctx):
+        cache.clear()
+        url = f"/api/tasks/?telegram_id={ctx.dataset['telegram_id']}"
+        url += f'&fields={fields}' if fields else '&omit=user_info'
+        return _get(ctx, url)
+    scenario(f'task_list_fields_{name}')(run)
+
+
+for _name, _fields in FIELD_SETS.items():
+    _field_set_scenario(_name, _fields)
+
+
+@scenario('task_list_cached')
+def task_list_cached(ctx):
+    return _get(ctx, f"/api/tasks/?telegram_id={ctx.dataset['telegram_id']}")
+
+
+@scenario('stats')
+def stats(ctx):
+    return _get(ctx, f"/api/profiles/{ctx.dataset['profile_id']}/stats/")
+
+
+@scenario('category_list')
+def category_list(ctx):
+    return _get(ctx, '/api/categories/')
+
+
+def _stub_sender(telegram_id, message, inline_keyboard=None):
+    return True
+
+
+def _run_celery_task(task):
+    with mock.patch('tasks.tasks.send_telegram_notification', _stub_sender):
+        task()
+
+
+@scenario('check_due_tasks')
+def check_due_tasks(ctx):
+    from tasks.tasks import check_due_tasks
+    _run_celery_task(check_due_tasks)
+
+
+@scenario('check_upcoming_tasks')
+def check_upcoming_tasks(ctx):
+    from tasks.tasks import check_upcoming_tasks
+    _run_celery_task(check_upcoming_tasks)
+
+
+@scenario('send_daily_reminder')
+def send_daily_reminder(ctx):
+    from tasks.tasks import send_daily_reminder
+    _run_celery_task(send_daily_reminder)
+
+
+@scenario('export_ndjson')
+def export_ndjson(ctx):
+    response = ctx.client.get(f"/api/tasks/export/?telegram_id={ctx.dataset['telegram_id']}&format=ndjson")
+    assert response.status_code == 200, response.status_code
+    return sum(len(chunk) for chunk in response.streaming_content)
+
+
+@scenario('import_ndjson')
+def import_ndjson(ctx):
+    # 2000 строк NDJSON: bulk_create задач, связей и журнала. Импорт идёт в отдельный профиль
+    # (его создаёт сам импорт), задачи прошлого повтора удаляются - набор данных не растёт
+    import io
+    import json
+    from benchmarks.seed import TELEGRAM_ID_BASE
+    from tasks.importer import TaskImporter
+    from tasks.models import Task, TaskChange
+    from tasks.signals import mute_task_signals
+
+    telegram_id = TELEGRAM_ID_BASE - 1
+    with mute_task_signals():
+        Task.objects.filter(user__telegram_id=telegram_id).delete()
+    TaskChange.objects.filter(telegram_id=telegram_id).delete()
+    lines = [
+        json.dumps({
+            'title': f'Импорт {i}',
+            'telegram_id': telegram_id,
+            'due_date': '2030-01-01 10:00',
+            'categories': ['Работа'] if i % 2 else [],
+        }, ensure_ascii=False)
+        for i in range(2000)
+    ]
+    report = TaskImporter().run(io.BytesIO('\n'.join(lines).encode()), 'ndjson')
+    assert report['imported'] == 2000, report
+
+
+# Транспорт бот <-> backend: кодирование, сжатие и обратный разбор одного ответа.
+# typical - список задач пользователя из набора данных, large - 5000 задач
+TRANSPORT_SIZES = {'typical': None, 'large': 5000}
+
+
+def _transport_payload(ctx, size):
+    # Сериализация в сценарий не входит - данные готовятся один раз на запуск
+    payloads = ctx.__dict__.setdefault('transport_payloads', {})
+    if size not in payloads:
+        from tasks.models import Task
+        from tasks.serializers import TaskSerializer
+        queryset = Task.objects.select_related('user__user').prefetch_related('categories').order_by('id')
+        if TRANSPORT_SIZES[size] is None:
+            queryset = queryset.filter(user_id=ctx.dataset['profile_id'])
+        else:
+            queryset = queryset[:TRANSPORT_SIZES[size]]
+        payloads[size] = TaskSerializer(queryset, many=True).data
+    return payloads[size]
+
+
+def _codecs():
+    import json
+    import msgpack
+    from rest_framework.renderers import JSONRenderer
+    from tasks.renderers import MessagePackRenderer
+    return {
+        'json': (JSONRenderer().render, json.loads),
+        'msgpack': (MessagePackRenderer().render, lambda data: msgpack.unpackb(data, raw=False)),
+    }
+
+
+def _compressors():
+    import gzip
+    import brotli
+    from tasks.middleware import BROTLI_QUALITY
+    return {
+        'none': (lambda data: data, lambda data: data),
+        'gzip': (gzip.compress, gzip.decompress),
+        'br': (lambda data: brotli.compress(data, quality=BROTLI_QUALITY), brotli.decompress),
+    }
+
+
+def _transport_scenario(size, codec, compression):
+    def run(ctx):
+        encode, decode = _codecs()[codec]
+        compress, decompress = _compressors()[compression]
+        wire = compress(encode(_transport_payload(ctx, size)))
+        decode(decompress(wire))
+        return len(wire)
+    scenario(f'transport_{size}_{codec}_{compression}')(run)
+
+
+for _size in TRANSPORT_SIZES:
+    for _codec in ('json', 'msgpack'):
+        for _compression in ('none', 'gzip', 'br'):
+            _transport_scenario(_size, _codec, _compression)
+
+
+# Повторяющиеся задачи: дата следующего повторения для 1000 серий, начатых 10 лет назад.
+# O(1) на серию независимо от числа прошедших повторений; iterative - перебор
+# для сравнения (только на 50 сериях, иначе прогон занимает минуты)
+RECURRENCE_SERIES = 1000
+RECURRENCE_AGE_DAYS = 3650
+
+
+def _recurring_tasks(ctx, freq):
+    tasks = ctx.__dict__.setdefault('recurring_tasks', {})
+    if freq not in tasks:
+        from datetime import timedelta
+        from django.utils import timezone
+        from tasks.models import Task
+        anchor = timezone.now() - timedelta(days=RECURRENCE_AGE_DAYS)
+        tasks[freq] = [
+            Task(
+                id=f'bench{i}', title='Повтор', due_date=anchor, recurrence_freq=freq,
+                recurrence_interval=1 + i % 3, series_id=f'bench{i}', recurrence_anchor=anchor,
+            )
+            for i in range(RECURRENCE_SERIES)
+        ]
+    return tasks[freq]
+
+
+def _recurrence_expand_scenario(freq):
+    def run(ctx):
+        from tasks.recurrence import next_occurrence
+        for task in _recurring_tasks(ctx, freq):
+            assert next_occurrence(task) is not None
+    scenario(f'recurrence_expand_{freq}')(run)
+
+
+for _freq in ('daily', 'weekly', 'monthly'):
+    _recurrence_expand_scenario(_freq)
+
+
+@scenario('recurrence_expand_iterative')
+def recurrence_expand_iterative(ctx):
+    from django.utils import timezone
+    from tasks.recurrence import occurrence_at
+    now = timezone.now()
+    for task in _recurring_tasks(ctx, 'daily')[:50]:
+        index = 0
+        while occurrence_at(task.recurrence_anchor, 'daily', task.recurrence_interval, index) <= now:
+            index += 1
+
+
+@scenario('recurrence_complete')
+def recurrence_complete(ctx):
+    # Выполнение повторения в серии, начатой 10 лет назад: создаётся ровно одна следующая задача.
+    # Серии создаются в отдельном профиле, задачи прошлого повтора удаляются - набор данных не растёт
+    from datetime import timedelta
+    from django.utils import timezone
+    from benchmarks.seed import TELEGRAM_ID_BASE
+    from tasks.models import Task
+    from tasks.profiles import get_or_create_telegram_profile
+    from tasks.signals import mute_task_signals
+
+    profile, _ = get_or_create_telegram_profile(TELEGRAM_ID_BASE - 2)
+    with mute_task_signals():
+        Task.objects.filter(user=profile).delete()
+    task = Task.objects.create(
+        title='Повтор', user_id=profile.id, recurrence_freq='daily',
+        due_date=timezone.now() - timedelta(days=RECURRENCE_AGE_DAYS),
+    )
+    response = ctx.client.post(f'/api/tasks/{task.id}/complete/')
+    assert response.status_code == 200, response.status_code
+    assert Task.objects.filter(series_id=task.id).count() == 2
+    return len(response.content)
+
+
+# Фасетный поиск по задачам пользователя: фасеты одним запросом вместо COUNT на категорию
+def _search_scenario(name, params):
+    def run(ctx):
+        from tasks.models import Category
+        categories = ','.join(Category.objects.order_by('name').values_list('id', flat=True)[:2])
+        return _get(ctx, f"/api/tasks/search/?telegram_id={ctx.dataset['telegram_id']}&categories={categories}&{params}")
+    scenario(f'search_{name}')(run)
+
+
+_search_scenario('any', 'match=any&state=open,overdue')
+_search_scenario('all', 'match=all&due_from=2000-01-01 00:00')
+_search_scenario('facets_only', 'match=any&page_size=1&fields=id')
+
+
+@scenario('calendar_month')
+def calendar_month(ctx):
+    # Текущий месяц: стоимость зависит от задач месяца, а не от всей истории пользователя
+    return _get(ctx, f"/api/tasks/calendar/?telegram_id={ctx.dataset['telegram_id']}")
+
+
+@scenario('calendar_week')
+def calendar_week(ctx):
+    from django.utils import timezone
+    year, week, _ = timezone.now().isocalendar()
+    return _get(ctx, f"/api/tasks/calendar/?telegram_id={ctx.dataset['telegram_id']}&week={year}-W{week:02d}")
+
+
+# Деревья подзадач: глубокое - цепочка на всю допустимую глубину с листьями на каждом уровне,
+# широкое - корень с TREE_WIDTH подзадачами. Деревья принадлежат отдельному профилю,
+# чтобы не менять списки задач остальных сценариев
+TREE_WIDTH = 2000
+TREE_LEAVES_PER_LEVEL = 20
+
+
+def _task_tree(ctx, shape):
+    trees = ctx.__dict__.setdefault('task_trees', {})
+    if shape not in trees:
+        from datetime import timedelta
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from benchmarks.seed import TELEGRAM_ID_BASE, _hash_id
+        from tasks.models import MAX_TASK_DEPTH, ArchivedTask, Task, UserProfile
+        telegram_id = TELEGRAM_ID_BASE + ctx.dataset['profiles'] + len(trees) + 1
+        user = User.objects.create(username=f'bench_tree_{shape}', email=f'bench_tree_{shape}@tg.local')
+        profile = UserProfile.objects.create(user=user, telegram_id=telegram_id)
+        due_date = timezone.now() + timedelta(days=1)
+        nodes = []
+
+        def add(parent, index):
+            task = Task(
+                id=_hash_id('tree', shape, index), title=f'Подзадача {index}', due_date=due_date,
+                user_id=profile.id, parent_id=parent.id if parent else None,
+                path=f'{parent.path}{parent.id}/' if parent else '', depth=parent.depth + 1 if parent else 0,
+                is_completed=index % 3 == 0,
+            )
+            nodes.append(task)
+            return task
+
+        root = add(None, 0)
+        if shape == 'deep':
+            parent = root
+            for _ in range(MAX_TASK_DEPTH):
+                for _leaf in range(TREE_LEAVES_PER_LEVEL):
+                    add(parent, len(nodes))
+                parent = add(parent, len(nodes))
+        else:
+            for _ in range(TREE_WIDTH):
+                add(root, len(nodes))
+        # bulk_create не вызывает Task.save(), поэтому path и depth заданы выше
+        Task.objects.bulk_create(nodes, batch_size=2000)
+        # Подзадача корня, уже перенесённая в архив: в списке с include_archived она ссылается на корень
+        now = timezone.now()
+        archived = ArchivedTask.objects.create(
+            id=_hash_id('tree', shape, 'archived'), title='Архивная подзадача', created_at=now, updated_at=now,
+            due_date=due_date, user_id=profile.id, completed_at=now, parent_id=root.id, depth=1,
+        )
+        trees[shape] = {'telegram_id': telegram_id, 'root': root.id, 'size': len(nodes), 'archived': archived.id}
+    return trees[shape]
+
+
+def _tree_scenarios(shape):
+    def subtree(ctx):
+        tree = _task_tree(ctx, shape)
+        return _get(ctx, f"/api/tasks/{tree['root']}/subtree/")
+
+    def task_list(ctx):
+        # Прогресс каждой задачи списка - одним дополнительным запросом на весь список
+        tree = _task_tree(ctx, shape)
+        return _get(ctx, f"/api/tasks/?telegram_id={tree['telegram_id']}&fields=id,title,parent,depth,progress")
+
+    def task_list_archived(ctx):
+        # Архивные подзадачи в общем списке сохраняют родителя и глубину
+        tree = _task_tree(ctx, shape)
+        response = ctx.client.get(
+            f"/api/tasks/?telegram_id={tree['telegram_id']}&include_archived=1&fields=id,parent,depth,is_archived"
+        )
+        assert response.status_code == 200, response.status_code
+        archived = next(task for task in response.json() if task['id'] == tree['archived'])
+        assert archived['parent'] == tree['root'] and archived['depth'] == 1, archived
+        return len(response.content)
+
+    def complete(ctx):
+        from tasks.models import Task
+        tree = _task_tree(ctx, shape)
+        # Сброс отметок - один UPDATE, чтобы каждый повтор выполнял всё дерево заново
+        Task.objects.filter(user__telegram_id=tree['telegram_id']).update(is_completed=False, completed_at=None)
+        response = ctx.client.post(f"/api/tasks/{tree['root']}/complete/", {'cascade': True}, format='json')
+        assert response.status_code == 200, response.status_code
+        assert not Task.objects.filter(user__telegram_id=tree['telegram_id'], is_completed=False).exists()
+        return len(response.content)
+
+    scenario(f'subtree_{shape}')(subtree)
+    scenario(f'task_list_tree_{shape}')(task_list)
+    scenario(f'task_list_tree_{shape}_archived')(task_list_archived)
+    scenario(f'complete_subtree_{shape}')(complete)
+
+
+for _shape in ('deep', 'wide'):
+    _tree_scenarios(_shape)
@@ -0,0 +1,83 @@
+import hashlib
+import random
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.utils import timezone
+from tasks.models import Task, Category, UserProfile
+
+DEFAULT_CATEGORIES = ['Работа', 'Личное', 'Учёба', 'Здоровье', 'Финансы', 'Дом', 'Хобби', 'Важное', 'Срочное']
+BATCH_SIZE = 5000
+TELEGRAM_ID_BASE = 900000000
+
+
+def _hash_id(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def seed(profiles=100, tasks=10000, max_categories_per_task=2, random_seed=42):
+    """Заполнить БД профилями, задачами и связями с категориями через bulk_create.
+
+    Дедлайны равномерно распределены в окне ±30 дней от текущего момента,
+    ~40% задач выполнены, ~1% задач попадают в ближайший час.
+    Возвращает описание набора данных для сценариев.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+
+    categories = []
+    for name in DEFAULT_CATEGORIES:
+        category = Category.objects.filter(name=name).first() or Category.objects.create(name=name)
+        categories.append(category.id)
+
+    users = User.objects.bulk_create(
+        [User(username=f'bench_{i}', email=f'bench_{i}@tg.local') for i in range(profiles)],
+        batch_size=BATCH_SIZE,
+    )
+    profile_objects = [
+        UserProfile(
+            id=_hash_id('profile', user.username),
+            user=user,
+            telegram_id=TELEGRAM_ID_BASE + i,
+            telegram_username=user.username,
+        )
+        for i, user in enumerate(users)
+    ]
+    UserProfile.objects.bulk_create(profile_objects, batch_size=BATCH_SIZE)
+
+    through = Task.categories.through
+    task_objects = []
+    links = []
+    for i in range(tasks):
+        profile = profile_objects[i % profiles]
+        if rng.random() < 0.01:
+            due_date = now + timedelta(minutes=rng.randint(1, 59))
+        else:
+            due_date = now + timedelta(minutes=rng.randint(-30 * 24 * 60, 30 * 24 * 60))
+        task_id = _hash_id('task', i, random_seed)
+        is_completed = rng.random() < 0.4
+        task_objects.append(Task(
+            id=task_id,
+            title=f'Задача {i}',
+            description=f'Описание задачи {i}' if rng.random() < 0.7 else '',
+            due_date=due_date,
+            user_id=profile.id,
+            is_completed=is_completed,
+            completed_at=min(due_date, now) if is_completed else None,
+            # Пороги профиля по умолчанию - [60]: напоминание за час
+            next_reminder_at=None if is_completed else due_date - timedelta(minutes=60),
+        ))
+        for category_id in rng.sample(categories, rng.randint(0, max_categories_per_task)):
+            links.append(through(task_id=task_id, category_id=category_id))
+        if len(task_objects) >= BATCH_SIZE:
+            Task.objects.bulk_create(task_objects)
+            task_objects = []
+    Task.objects.bulk_create(task_objects)
+    through.objects.bulk_create(links, batch_size=BATCH_SIZE)
+
+    return {
+        'profiles': profiles,
+        'tasks': tasks,
+        'links': len(links),
+        'profile_id': profile_objects[0].id,
+        'telegram_id': profile_objects[0].telegram_id,
+    }
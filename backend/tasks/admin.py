@@ -1,10 +1,21 @@
 from django.contrib import admin
-from .models import Task, Category, UserProfile
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import Task, Category, UserProfile, TaskChange, ProfileRecord, ArchivedTask
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
-    list_display = ('title', 'user', 'created_at', 'due_date', 'is_completed')
-    list_filter = ('is_completed', 'due_date', 'categories')
+    list_display = ('title', 'user', 'created_at', 'due_date', 'is_completed', 'recurrence_freq')
+    list_filter = ('is_completed', 'due_date', 'categories', 'recurrence_freq')
+    raw_id_fields = ('parent',)
+    search_fields = ('title', 'description')
+
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(admin.ModelAdmin):
+    list_display = ('title', 'user', 'due_date', 'completed_at', 'archived_at')
+    list_filter = ('archived_at',)
     search_fields = ('title', 'description')
 
 @admin.register(Category)
@@ -16,3 +27,36 @@ class CategoryAdmin(admin.ModelAdmin):
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user',)
     search_fields = ('user__username',)
+
+@admin.register(TaskChange)
+class TaskChangeAdmin(admin.ModelAdmin):
+    list_display = ('seq', 'kind', 'task_id', 'telegram_id', 'changed_at')
+    list_filter = ('kind',)
+    search_fields = ('task_id',)
+
+@admin.register(ProfileRecord)
+class ProfileRecordAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'name', 'duration_ms', 'size', 'download_link')
+    list_filter = ('kind',)
+    search_fields = ('name',)
+    readonly_fields = ('kind', 'name', 'duration_ms', 'file_name', 'size', 'created_at', 'download_link', 'summary')
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download), name='tasks_profilerecord_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk):
+        record = get_object_or_404(ProfileRecord, pk=pk)
+        try:
+            return FileResponse(open(record.path, 'rb'), as_attachment=True, filename=record.file_name)
+        except FileNotFoundError:
+            raise Http404('Файл профиля не найден')
+
+    @admin.display(description='Файл')
+    def download_link(self, obj):
+        url = reverse('admin:tasks_profilerecord_download', args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, obj.file_name)
@@ -0,0 +1,101 @@
+import re
+from datetime import date, datetime, timedelta
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When, Window
+from django.db.models.functions import RowNumber, TruncDate
+from .models import Task
+
+MONTH_RE = re.compile(r'^(\d{4})-(\d{2})$')
+WEEK_RE = re.compile(r'^(\d{4})-W(\d{2})$')
+
+
+class PeriodError(ValueError):
+    pass
+
+
+def parse_period(month=None, week=None, today=None):
+    """(первый день, день после последнего, метка) для ?month=YYYY-MM или ?week=YYYY-Www"""
+    try:
+        if week:
+            match = WEEK_RE.match(week)
+            if not match:
+                raise PeriodError('week must be YYYY-Www')
+            start = date.fromisocalendar(int(match.group(1)), int(match.group(2)), 1)
+        elif month:
+            match = MONTH_RE.match(month)
+            if not match:
+                raise PeriodError('month must be YYYY-MM')
+            start = date(int(match.group(1)), int(match.group(2)), 1)
+        else:
+            start = today.replace(day=1)
+        # Последний месяц/неделя 9999 года: конец периода уже за пределами date
+        end = start + timedelta(days=7) if week else (start + timedelta(days=32)).replace(day=1)
+    except (ValueError, OverflowError) as e:
+        raise PeriodError(str(e))
+    if week:
+        return start, end, {'week': week}
+    return start, end, {'month': start.strftime('%Y-%m')}
+
+
+def local_midnight(day, tz):
+    return tz.localize(datetime.combine(day, datetime.min.time()))
+
+
+def _count_if(condition, day):
+    return Window(
+        Sum(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField())),
+        partition_by=[day],
+    )
+
+
+def calendar_days(profile_id, tz, start, end, now, titles_per_day):
+    """Дни периода со счётчиками и первыми titles_per_day задачами - одним запросом.
+
+    Дни считаются в часовом поясе пользователя (TruncDate с tzinfo), счётчики дня -
+    оконные суммы по дню, а ROW_NUMBER() оставляет первые задачи каждого дня.
+    Диапазон дедлайнов задаётся в UTC, поэтому запрос идёт по индексу (user, due_date).
+    """
+    day = TruncDate('due_date', tzinfo=tz)
+    rows = (
+        Task.objects.filter(
+            user_id=profile_id,
+            due_date__gte=local_midnight(start, tz),
+            due_date__lt=local_midnight(end, tz),
+        )
+        .annotate(
+            day=day,
+            position=Window(RowNumber(), partition_by=[day], order_by=[F('due_date').asc(), F('id').asc()]),
+            day_total=Window(Count('id'), partition_by=[day]),
+            day_completed=_count_if(Q(is_completed=True), day),
+            day_overdue=_count_if(Q(is_completed=False, due_date__lt=now), day),
+        )
+        .filter(position__lte=titles_per_day)
+        .order_by('day', 'position')
+        .values('id', 'title', 'due_date', 'is_completed', 'day', 'day_total', 'day_completed', 'day_overdue')
+    )
+
+    days = {}
+    for row in rows:
+        entry = days.get(row['day'])
+        if entry is None:
+            entry = days[row['day']] = {
+                'total': row['day_total'],
+                'open': row['day_total'] - row['day_completed'] - row['day_overdue'],
+                'completed': row['day_completed'],
+                'overdue': row['day_overdue'],
+                'tasks': [],
+            }
+        entry['tasks'].append({
+            'id': row['id'],
+            'title': row['title'],
+            'due_date': row['due_date'].astimezone(tz).strftime('%Y-%m-%d %H:%M'),
+            'is_completed': row['is_completed'],
+        })
+
+    result = []
+    current = start
+    while current < end:
+        entry = days.get(current, {'total': 0, 'open': 0, 'completed': 0, 'overdue': 0, 'tasks': []})
+        result.append({'date': current.isoformat(), **entry})
+        current += timedelta(days=1)
+    return result
+
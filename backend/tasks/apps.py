@@ -5,3 +5,6 @@ class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
     verbose_name = 'ToDo Tasks'
+
+    def ready(self):
+        from . import metrics, profiling, signals  # noqa: F401
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import time
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES_VERSION_KEY = 'categories:ver'
+TASKS_VERSION_KEY = 'tasks:ver'
+CHANGED_AT_KEY = 'changed_at'
+CATEGORIES_CHANGED_AT_KEY = 'changed_at:categories'
+HITS_KEY = 'tasks:list:hits'
+MISSES_KEY = 'tasks:list:misses'
+
+
+def user_version_key(telegram_id):
+    return f'tasks:ver:{telegram_id}'
+
+
+def user_changed_at_key(telegram_id):
+    return f'changed_at:{telegram_id}'
+
+
+def _initial_version():
+    # Если счётчик вытеснен из Redis, новая версия не должна совпасть со старыми
+    return int(time.time() * 1000)
+
+
+def _get_with_versions(keys, version_keys):
+    """get_many, при котором отсутствующие счётчики версий создаются"""
+    values = cache.get_many(keys)
+    missing = {key: _initial_version() for key in version_keys if key not in values}
+    for key, value in missing.items():
+        cache.add(key, value, timeout=None)
+    if missing:
+        values.update(cache.get_many(list(missing)))
+    return values
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+
+
+def get_validator_state(telegram_id=None, list_key=None):
+    """Версии и время последнего изменения для ETag/Last-Modified (без запросов к БД).
+
+    С list_key тем же MGET читается закэшированный список задач: state['cached_list'] -
+    запись, построенная при текущих версиях пользователя и категорий, иначе None.
+    None, если Redis недоступен: ответ тогда отдаётся из основной БД без кэша и валидаторов.
+    """
+    try:
+        return _get_validator_state(telegram_id, list_key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache unavailable, serving without validators: {e}")
+        return None
+
+
+def _get_validator_state(telegram_id, list_key=None):
+    version_keys = [CATEGORIES_VERSION_KEY, TASKS_VERSION_KEY]
+    keys = version_keys + [CHANGED_AT_KEY, CATEGORIES_CHANGED_AT_KEY]
+    if telegram_id is not None:
+        version_keys.append(user_version_key(telegram_id))
+        keys += [user_version_key(telegram_id), user_changed_at_key(telegram_id)]
+    if list_key is not None:
+        keys.append(list_key)
+    values = _get_with_versions(keys, version_keys)
+    state = {
+        'categories_version': values[CATEGORIES_VERSION_KEY],
+        'tasks_version': values[TASKS_VERSION_KEY],
+        'changed_at': values.get(CHANGED_AT_KEY),
+        'categories_changed_at': values.get(CATEGORIES_CHANGED_AT_KEY),
+    }
+    if telegram_id is not None:
+        state['user_version'] = values[user_version_key(telegram_id)]
+        state['user_changed_at'] = values.get(user_changed_at_key(telegram_id))
+    if list_key is not None:
+        entry = values.get(list_key)
+        versions = (state.get('user_version'), state['categories_version'])
+        state['cached_list'] = entry if entry is not None and entry['versions'] == versions else None
+    return state
+
+
+def task_list_cache_key(telegram_id, query_params, media_type):
+    """Ключ ответа: пользователь + хэш параметров запроса и формата.
+
+    Версии в ключ не входят - они хранятся в самой записи, поэтому ключ известен
+    до чтения версий и запись читается вместе с ними одним MGET.
+    """
+    params = sorted((key, value) for key, values in query_params.lists() for value in values)
+    params_hash = hashlib.md5(repr((params, media_type)).encode()).hexdigest()
+    return f'tasks:list:{telegram_id}:{params_hash}'
+
+
+def set_cached_task_list(key, state, data, tasks, etag, last_modified):
+    """Кэширует список вместе с его валидаторами: на попадании не нужен и агрегатный запрос"""
+    entry = {
+        'versions': (state['user_version'], state['categories_version']),
+        'etag': etag,
+        'last_modified': last_modified,
+        'data': data,
+    }
+    try:
+        cache.set(key, entry, timeout=task_list_timeout(tasks))
+    except redis.RedisError as e:
+        logger.warning(f"Failed to cache task list: {e}")
+
+
+def task_list_timeout(tasks):
+    """TTL ответа: не дольше, чем до ближайшего дедлайна (is_overdue зависит от времени)"""
+    timeout = settings.TASK_LIST_CACHE_TTL
+    now = timezone.now()
+    upcoming = [task.due_date for task in tasks if not task.is_completed and task.due_date > now]
+    if upcoming:
+        timeout = min(timeout, int((min(upcoming) - now).total_seconds()) + 1)
+    return timeout
+
+
+def record_lookup(hit):
+    try:
+        cache.incr(HITS_KEY if hit else MISSES_KEY)
+    except ValueError:
+        cache.add(HITS_KEY if hit else MISSES_KEY, 1, timeout=None)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to record cache lookup: {e}")
+
+
+def invalidate_for_events(events):
+    """Сброс кэша списков задач: O(1) на пользователя, без перебора ключей"""
+    telegram_ids = set()
+    categories_changed = False
+    tasks_changed = False
+    for kind, _, telegram_id in events:
+        if kind.startswith('category.'):
+            categories_changed = True
+        elif telegram_id is not None:
+            telegram_ids.add(telegram_id)
+        tasks_changed = tasks_changed or kind.startswith('task.')
+    for telegram_id in telegram_ids:
+        bump_version(user_version_key(telegram_id))
+    if categories_changed:
+        bump_version(CATEGORIES_VERSION_KEY)
+    if tasks_changed:
+        bump_version(TASKS_VERSION_KEY)
+    # Время изменения нужно для Last-Modified: удаление не оставляет updated_at
+    now = int(time.time())
+    changed_at = {user_changed_at_key(telegram_id): now for telegram_id in telegram_ids}
+    changed_at[CHANGED_AT_KEY] = now
+    if categories_changed:
+        changed_at[CATEGORIES_CHANGED_AT_KEY] = now
+    cache.set_many(changed_at, timeout=None)
+
+
+def get_category_names():
+    """{id: имя} всех категорий; ключ содержит версию категорий, поэтому сброс не нужен"""
+    from .models import Category
+
+    try:
+        version = _get_with_versions([CATEGORIES_VERSION_KEY], [CATEGORIES_VERSION_KEY])[CATEGORIES_VERSION_KEY]
+        key = f'categories:names:{version}'
+        names = cache.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Category names cache unavailable: {e}")
+        return dict(Category.objects.order_by('name').values_list('id', 'name'))
+    if names is None:
+        names = dict(Category.objects.order_by('name').values_list('id', 'name'))
+        try:
+            cache.set(key, names, timeout=settings.TASK_LIST_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to cache category names: {e}")
+    return names
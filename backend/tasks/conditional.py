@@ -0,0 +1,39 @@
+import hashlib
+from datetime import datetime
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Сильный ETag из произвольных значений (версий, агрегатов)"""
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def latest_timestamp(*values):
+    """Максимум из datetime/unix-времени (None пропускаются) в секундах"""
+    timestamps = [
+        int(value.timestamp()) if isinstance(value, datetime) else int(value)
+        for value in values if value is not None
+    ]
+    return max(timestamps) if timestamps else None
+
+
+def set_validators(response, etag, last_modified=None):
+    # Тело зависит от Accept (JSON / MessagePack), поэтому и ETag считается с учётом формата
+    patch_vary_headers(response, ('Accept',))
+    # Без Redis версии неизвестны - ответ отдаётся без валидаторов
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """304 (или 412 для If-Match), если клиентская копия актуальна, иначе None"""
+    if etag is None and last_modified is None:
+        return None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,54 @@
+import json
+import logging
+import redis
+from django.conf import settings
+from django.db import transaction
+from .redis_client import get_redis
+from .cache import invalidate_for_events
+from .models import TaskChange
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'todo:changes:version'
+
+
+def record_changes(events):
+    """Зафиксировать изменения задач, категорий и профилей.
+
+    events - список кортежей (kind, object_id, telegram_id), например
+    ('task.updated', task.id, 123456789). Изменения задач пишутся в журнал
+    TaskChange в текущей транзакции - вместе с самим изменением или не пишутся
+    вовсе; после коммита сбрасывается кэш списков задач и события публикуются
+    в Redis. Каждое событие получает монотонный номер версии, по пропускам
+    в котором подписчик понимает, что часть событий потеряна.
+    """
+    events = list(events)
+    if not events:
+        return
+    TaskChange.objects.bulk_create([
+        TaskChange(task_id=object_id, telegram_id=telegram_id, kind=kind.split('.', 1)[1])
+        for kind, object_id, telegram_id in events if kind.startswith('task.')
+    ])
+    transaction.on_commit(lambda: _publish(events))
+
+
+def _publish(events):
+    try:
+        invalidate_for_events(events)
+    except Exception as e:
+        logger.error(f"Failed to invalidate task list cache: {e}")
+    try:
+        client = get_redis()
+        last_version = client.incrby(VERSION_KEY, len(events))
+        pipe = client.pipeline(transaction=False)
+        for version, (kind, object_id, telegram_id) in enumerate(events, start=last_version - len(events) + 1):
+            pipe.publish(settings.CHANGE_EVENTS_CHANNEL, json.dumps({
+                'kind': kind,
+                'id': object_id,
+                'telegram_id': telegram_id,
+                'version': version,
+            }))
+        pipe.execute()
+    except redis.RedisError as e:
+        # Изменение уже сохранено - потерю события подписчики заметят по пропуску версии
+        logger.error(f"Failed to publish {len(events)} change events: {e}")
@@ -0,0 +1,245 @@
+import codecs
+import csv
+import hashlib
+import json
+import time
+from datetime import datetime
+from django.db import transaction
+from django.utils import timezone
+from .events import record_changes
+from .models import Task, Category, UserProfile, LOCAL_TZ
+from .profiles import get_or_create_telegram_profile
+from .reminders import next_reminder_at
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_BATCH_SIZE = 2000
+# Сколько ошибок по строкам хранить в отчёте (считаются все)
+MAX_REPORTED_ERRORS = 1000
+
+TRUE_VALUES = {'1', 'true', 'yes', 'да', 'y'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(file_name, default='ndjson'):
+    """Формат по расширению файла: .csv или .ndjson/.jsonl"""
+    name = (file_name or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+
+def iter_rows(stream, fmt):
+    """Построчно читает бинарный поток, отдаёт (номер строки, dict) или (номер строки, RowError)"""
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, RowError(f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line_num, RowError('expected a JSON object')
+            continue
+        yield line_num, row
+
+
+def parse_due_date(value):
+    # Формат бота 'YYYY-MM-DD HH:MM' в местном времени, иначе ISO 8601
+    if not value:
+        raise RowError('due_date required')
+    if not isinstance(value, str):
+        raise RowError(f'invalid due_date: {value!r}')
+    try:
+        if len(value) == 16 and value[10] == ' ':
+            return LOCAL_TZ.localize(datetime.strptime(value, '%Y-%m-%d %H:%M'))
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise RowError(f'invalid due_date: {value}')
+    if parsed.tzinfo is None:
+        parsed = LOCAL_TZ.localize(parsed)
+    return parsed
+
+
+def parse_telegram_id(value):
+    # bool - тоже int, но True вместо telegram_id - явно ошибка в файле
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise RowError(f'invalid telegram_id: {value!r}')
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f'invalid telegram_id: {value}')
+
+
+def parse_text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise RowError(f'{field} must be a string')
+    return value
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def parse_category_names(value):
+    # В CSV категории перечисляются через ';', в NDJSON - списком или той же строкой
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise RowError('categories must be a list of strings')
+    return [name.strip() for name in value if name.strip()]
+
+
+class TaskImporter:
+    """Потоковый импорт задач пачками через bulk_create.
+
+    Профили и категории резолвятся через словари в памяти, поэтому на пачку
+    приходится несколько запросов независимо от её размера: вставка задач,
+    вставка связей с категориями и запись в журнал изменений.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, create_profiles=True, create_categories=False):
+        self.batch_size = batch_size
+        self.create_profiles = create_profiles
+        self.create_categories = create_categories
+        self.categories = {name.lower(): category_id for category_id, name in Category.objects.values_list('id', 'name')}
+        self.profiles = {}
+        self.profile_offsets = {}
+        self.imported = 0
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+        self._batch = []
+        self._seq = 0
+        self.started_at = timezone.now()
+
+    def run(self, stream, fmt):
+        started = time.perf_counter()
+        for line_num, row in iter_rows(stream, fmt):
+            self.rows += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                self._batch.append(self.build(row))
+            except RowError as e:
+                self.add_error(line_num, str(e))
+                continue
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+        self.flush()
+        duration = time.perf_counter() - started
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'failed': self.error_count,
+            'errors': self.errors,
+            'duration_s': round(duration, 3),
+            'rows_per_s': round(self.rows / duration, 1) if duration else None,
+        }
+
+    def add_error(self, line_num, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_num, 'error': message})
+
+    def build(self, row):
+        # Сначала вся строка проверяется целиком: профиль и категории создаются
+        # только для строки, которая точно будет импортирована
+        title = parse_text(row, 'title').strip()
+        if not title:
+            raise RowError('title required')
+        if len(title) > Task._meta.get_field('title').max_length:
+            raise RowError('title is too long')
+        description = parse_text(row, 'description')
+        telegram_username = parse_text(row, 'telegram_username')
+        telegram_id = parse_telegram_id(row.get('telegram_id'))
+        due_date = parse_due_date(row.get('due_date'))
+        is_completed = parse_bool(row.get('is_completed'))
+        notifications_disabled = parse_bool(row.get('notifications_disabled'))
+        category_names = parse_category_names(row.get('categories'))
+        if not self.create_categories:
+            for name in category_names:
+                if name.lower() not in self.categories:
+                    raise RowError(f'unknown category: {name}')
+
+        profile_id = self.resolve_profile(telegram_id, telegram_username)
+        category_ids = [self.resolve_category(name) for name in category_names]
+
+        # Тот же вид id, что и в Task.save(), плюс счётчик - внутри одной миллисекунды id не совпадут
+        self._seq += 1
+        task_id = hashlib.md5(f'{title}{profile_id}{time.time()}{self._seq}'.encode()).hexdigest()
+        task = Task(
+            id=task_id,
+            title=title,
+            description=description,
+            due_date=due_date,
+            user_id=profile_id,
+            is_completed=is_completed,
+            # bulk_create не вызывает Task.save()
+            completed_at=self.started_at if is_completed else None,
+            notifications_disabled=notifications_disabled,
+            next_reminder_at=(
+                None if is_completed or notifications_disabled
+                else next_reminder_at(due_date, self.profile_offsets[profile_id])
+            ),
+        )
+        return task, telegram_id, set(category_ids)
+
+    def resolve_profile(self, telegram_id, telegram_username=None):
+        if telegram_id in self.profiles:
+            return self.profiles[telegram_id]
+
+        found = UserProfile.objects.filter(telegram_id=telegram_id).values_list('id', 'reminder_offsets').first()
+        if found is None:
+            if not self.create_profiles:
+                raise RowError(f'unknown telegram_id: {telegram_id}')
+            profile, _ = get_or_create_telegram_profile(telegram_id, telegram_username or f'tg_{telegram_id}')
+            found = profile.id, profile.reminder_offsets
+        profile_id, offsets = found
+        self.profile_offsets[profile_id] = offsets
+        self.profiles[telegram_id] = profile_id
+        return profile_id
+
+    def resolve_category(self, name):
+        category_id = self.categories.get(name.lower())
+        if category_id is None:
+            if not self.create_categories:
+                raise RowError(f'unknown category: {name}')
+            category_id = Category.objects.create(name=name).id
+            self.categories[name.lower()] = category_id
+        return category_id
+
+    def flush(self):
+        if not self._batch:
+            return
+        through = Task.categories.through
+        with transaction.atomic():
+            Task.objects.bulk_create([task for task, _, _ in self._batch])
+            through.objects.bulk_create([
+                through(task_id=task.id, category_id=category_id)
+                for task, _, category_ids in self._batch
+                for category_id in category_ids
+            ])
+            # bulk_create не вызывает сигналы - журнал и сброс кэшей делаем сами
+            record_changes(('task.created', task.id, telegram_id) for task, telegram_id, _ in self._batch)
+        self.imported += len(self._batch)
+        self._batch = []
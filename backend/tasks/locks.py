@@ -0,0 +1,29 @@
+import contextlib
+import logging
+import redis
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def single_run(name, timeout):
+    """Не даёт запустить задачу, пока предыдущий запуск ещё выполняется.
+
+    Отдаёт True, если блокировка получена. Блокировка снимается автоматически
+    через timeout секунд, если процесс упал. Без Redis задача выполняется как обычно.
+    """
+    try:
+        lock = get_redis().lock(f'todo:lock:{name}', timeout=timeout)
+        acquired = lock.acquire(blocking=False)
+    except redis.RedisError as e:
+        logger.error(f"Lock {name} unavailable, running without it: {e}")
+        lock, acquired = None, True
+    try:
+        yield acquired
+    finally:
+        if lock is not None and acquired:
+            try:
+                lock.release()
+            except redis.RedisError as e:
+                logger.warning(f"Failed to release lock {name}: {e}")
@@ -0,0 +1,100 @@
+import json
+import time
+from unittest import mock
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from benchmarks import runner, seed
+from benchmarks.fake_telegram import FakeTelegramServer
+from tasks import tasks as notification_tasks
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Load-test the notification pipeline against a local fake Telegram Bot API server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=50, help='Number of user profiles to seed')
+        parser.add_argument('--tasks', type=int, default=2000, help='Number of tasks to seed')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Fake server response latency')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Random extra latency up to this value')
+        parser.add_argument('--rate-limit-ratio', type=float, default=0, help='Share of requests answered with 429')
+        parser.add_argument('--error-ratio', type=float, default=0, help='Share of requests answered with 500')
+        parser.add_argument('--output', type=str, help='Write JSON results to this file')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        fake = FakeTelegramServer(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            rate_limit_ratio=options['rate_limit_ratio'],
+            error_ratio=options['error_ratio'],
+            random_seed=42,
+        )
+        with fake, runner.benchmark_database(keepdb=options['keepdb']):
+            seed.seed(profiles=options['profiles'], tasks=options['tasks'])
+            now = timezone.now()
+            pending = Task.objects.filter(is_completed=False, notifications_disabled=False)
+            expected = {
+                'check_due_tasks': pending.filter(due_date__lte=now).count(),
+                'check_upcoming_tasks': pending.filter(due_date__gt=now, next_reminder_at__lte=now).count(),
+            }
+            self.stdout.write(f"Fake Bot API at {fake.url}, expecting {sum(expected.values())} messages")
+
+            with override_settings(TELEGRAM_API_URL=fake.url, BOT_TOKEN='bench'):
+                results = {name: self.run_scan(name, fake, count) for name, count in expected.items()}
+
+        output = json.dumps({
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'profiles': options['profiles'],
+                'tasks': options['tasks'],
+                'latency_ms': options['latency_ms'],
+                'jitter_ms': options['jitter_ms'],
+                'rate_limit_ratio': options['rate_limit_ratio'],
+                'error_ratio': options['error_ratio'],
+            },
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_scan(self, name, fake, expected):
+        latencies = []
+        original = notification_tasks.send_telegram_notification
+
+        def timed_send(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        stats_before = dict(fake.stats)
+        with mock.patch.object(notification_tasks, 'send_telegram_notification', timed_send):
+            start = time.perf_counter()
+            getattr(notification_tasks, name)()
+            elapsed = time.perf_counter() - start
+
+        delivered = fake.stats['delivered'] - stats_before['delivered']
+        return {
+            'expected': expected,
+            'attempted': len(latencies),
+            'delivered': delivered,
+            'rate_limited': fake.stats['rate_limited'] - stats_before['rate_limited'],
+            'errors': fake.stats['errors'] - stats_before['errors'],
+            'lost': expected - delivered,
+            'loss_ratio': round((expected - delivered) / expected, 4) if expected else 0,
+            'duration_s': round(elapsed, 3),
+            'messages_per_s': round(delivered / elapsed, 1) if elapsed else 0,
+            'latency_ms': {
+                'p50': round(runner.percentile(latencies, 50), 2) if latencies else None,
+                'p95': round(runner.percentile(latencies, 95), 2) if latencies else None,
+                'p99': round(runner.percentile(latencies, 99), 2) if latencies else None,
+                'max': round(max(latencies), 2) if latencies else None,
+            },
+        }
@@ -0,0 +1,71 @@
+import json
+import platform
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from benchmarks import runner, seed
+from benchmarks.scenarios import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Run API and Celery benchmarks on a seeded test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=100, help='Number of user profiles to seed')
+        parser.add_argument('--tasks', type=int, default=10000, help='Number of tasks to seed')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per scenario')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=sorted(SCENARIOS),
+            help='Scenario to run (can be repeated, default: all)'
+        )
+        parser.add_argument('--output', type=str, help='Write JSON results to this file')
+        parser.add_argument('--baseline', type=str, help='JSON results of a previous run to compare against')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Allowed median slowdown relative to the baseline (0.2 = 20%%)'
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        with runner.benchmark_database(keepdb=options['keepdb']):
+            self.stdout.write(f"Seeding {options['profiles']} profiles and {options['tasks']} tasks...")
+            started = timezone.now()
+            dataset = seed.seed(profiles=options['profiles'], tasks=options['tasks'])
+            seed_seconds = (timezone.now() - started).total_seconds()
+            self.stdout.write(f'Seeded in {seed_seconds:.1f}s')
+            results = runner.run(dataset, names=options['scenario'], repeat=options['repeat'])
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'repeat': options['repeat'],
+                'seed_seconds': round(seed_seconds, 3),
+                **{key: dataset[key] for key in ('profiles', 'tasks', 'links')},
+            },
+            'results': results,
+        }
+
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = runner.compare(results, baseline['results'], options['threshold'])
+            report['regressions'] = regressions
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if regressions:
+            raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+
@@ -0,0 +1,71 @@
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from tasks.cache import HITS_KEY, MISSES_KEY
+
+SCAN_BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = 'Show task list cache hit rate, its own memory footprint and Redis instance memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset hit/miss counters after printing'
+        )
+
+    def handle(self, *args, **options):
+        counters = cache.get_many([HITS_KEY, MISSES_KEY])
+        hits = counters.get(HITS_KEY, 0)
+        misses = counters.get(MISSES_KEY, 0)
+        total = hits + misses
+        hit_rate = (hits / total * 100) if total > 0 else 0
+        self.stdout.write(f'Task list cache: {hits} hits, {misses} misses, hit rate {hit_rate:.1f}%')
+
+        location = settings.CACHES['default'].get('LOCATION')
+        if 'redis' not in settings.CACHES['default']['BACKEND'].lower() or not isinstance(location, str):
+            self.stdout.write('Cache backend is not a single Redis server, memory usage unavailable')
+        else:
+            client = redis.Redis.from_url(location)
+            self.write_list_cache_usage(client)
+            self.write_instance_usage(client)
+
+        if options['reset']:
+            cache.delete_many([HITS_KEY, MISSES_KEY])
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
+
+    def write_list_cache_usage(self, client):
+        # Только ключи списков задач: SCAN по префиксу и MEMORY USAGE пачками
+        counters = {cache.make_key(HITS_KEY).encode(), cache.make_key(MISSES_KEY).encode()}
+        keys = used = 0
+        batch = []
+        for key in client.scan_iter(match=cache.make_key('tasks:list:*'), count=SCAN_BATCH):
+            if key in counters:
+                continue
+            batch.append(key)
+            if len(batch) >= SCAN_BATCH:
+                keys, used = keys + len(batch), used + self.memory_usage(client, batch)
+                batch = []
+        keys, used = keys + len(batch), used + self.memory_usage(client, batch)
+        self.stdout.write(f'Task list cache memory: {keys} keys, {used / 1024 / 1024:.2f}M')
+
+    def memory_usage(self, client, keys):
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        # Ключ мог истечь между SCAN и MEMORY USAGE
+        return sum(size or 0 for size in pipe.execute())
+
+    def write_instance_usage(self, client):
+        # Вся база Redis: кроме кэша там очереди Celery, лимиты, блокировки и pub/sub
+        info = client.info('memory')
+        self.stdout.write(
+            f"Redis instance memory (all data, not only the cache): used {info.get('used_memory_human')}, "
+            f"peak {info.get('used_memory_peak_human')}, "
+            f"maxmemory policy {info.get('maxmemory_policy', 'n/a')}"
+        )
+        for db, stats in client.info('keyspace').items():
+            self.stdout.write(f"Redis instance {db}: {stats.get('keys')} keys, {stats.get('expires')} with TTL")
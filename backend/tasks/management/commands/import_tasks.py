@@ -0,0 +1,49 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from tasks.importer import DEFAULT_BATCH_SIZE, FORMATS, TaskImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Import tasks from a CSV or NDJSON file (use "-" for stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV/NDJSON file or "-" for stdin')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Input format (default: by file extension, otherwise ndjson)'
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per bulk insert')
+        parser.add_argument(
+            '--no-create-profiles',
+            action='store_true',
+            help='Reject rows with unknown telegram_id instead of creating profiles'
+        )
+        parser.add_argument('--create-categories', action='store_true', help='Create unknown categories')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        importer = TaskImporter(
+            batch_size=options['batch_size'],
+            create_profiles=not options['no_create_profiles'],
+            create_categories=options['create_categories'],
+        )
+        if path == '-':
+            report = importer.run(sys.stdin.buffer, fmt)
+        else:
+            try:
+                with open(path, 'rb') as stream:
+                    report = importer.run(stream, fmt)
+            except FileNotFoundError:
+                raise CommandError(f'File not found: {path}')
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if report['failed'] > len(report['errors']):
+            self.stderr.write(f"... and {report['failed'] - len(report['errors'])} more errors")
+        style = self.style.SUCCESS if not report['failed'] else self.style.WARNING
+        self.stdout.write(style(
+            f"Imported {report['imported']} of {report['rows']} rows in {report['duration_s']} s "
+            f"({report['rows_per_s']} rows/s), {report['failed']} failed"
+        ))
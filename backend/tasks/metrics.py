@@ -0,0 +1,104 @@
+import logging
+import os
+import time
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_ready, worker_process_shutdown
+from django.conf import settings
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# При prefork-пуле метрики собираются из всех процессов через PROMETHEUS_MULTIPROC_DIR
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds',
+    'Длительность выполнения Celery-задач',
+    ['task', 'state'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+TASK_QUEUE_LAG = Histogram(
+    'celery_task_queue_lag_seconds',
+    'Задержка между постановкой задачи в очередь (в т.ч. из beat) и началом выполнения',
+    ['task'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 300),
+)
+SCAN_ROWS_MATCHED = Gauge(
+    'todo_scan_rows_matched',
+    'Строк, найденных последним запуском сканирования',
+    ['scan'],
+    multiprocess_mode='mostrecent',
+)
+SCAN_IN_PROGRESS = Gauge(
+    'todo_scan_in_progress',
+    'Сканирования, выполняющиеся прямо сейчас',
+    ['scan'],
+    multiprocess_mode='livesum',
+)
+SCAN_SKIPPED = Counter(
+    'todo_scan_skipped_total',
+    'Запуски, пропущенные из-за незавершённого предыдущего запуска',
+    ['scan'],
+)
+NOTIFICATIONS = Counter(
+    'todo_notifications_total',
+    'Уведомления в Telegram по результату (attempted = sent + failed)',
+    ['scan', 'result'],
+)
+NOTIFICATION_LAG = Histogram(
+    'todo_notification_lag_seconds',
+    'Задержка между дедлайном задачи и фактической отправкой уведомления',
+    ['scan'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 900, 3600, 6 * 3600, 24 * 3600),
+)
+
+_task_started = {}
+
+
+def record_notification(scan, sent, lag_seconds=None):
+    NOTIFICATIONS.labels(scan=scan, result='sent' if sent else 'failed').inc()
+    if sent and lag_seconds is not None:
+        NOTIFICATION_LAG.labels(scan=scan).observe(max(lag_seconds, 0))
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect
+def on_task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    published_at = task.request.get('published_at')
+    if published_at is None:
+        published_at = (task.request.headers or {}).get('published_at')
+    if published_at is not None:
+        TASK_QUEUE_LAG.labels(task=task.name).observe(max(time.time() - published_at, 0))
+
+
+@task_postrun.connect
+def on_task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task=task.name, state=state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    port = settings.CELERY_METRICS_PORT
+    if not port:
+        return
+    registry = REGISTRY
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+    logger.info(f"Celery metrics available on port {port}")
+
+
+@worker_process_shutdown.connect
+def mark_process_dead(pid=None, **kwargs):
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid or os.getpid())
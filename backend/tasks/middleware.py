@@ -0,0 +1,271 @@
+import contextlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # без пакета brotli остаётся только gzip
+    brotli = None
+from .profiling import save_profile, start_profiler, wants_profile
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+ACCEPTS_BR_RE = re.compile(r'\bbr\b')
+# Ответы меньше этого размера не сжимаются (как в GZipMiddleware)
+COMPRESS_MIN_LENGTH = 200
+# Качество 4 - компромисс для динамических ответов: 11 в десятки раз медленнее
+BROTLI_QUALITY = 4
+
+
+def query_shape(sql):
+    """Форма запроса: списки IN (%s, %s, ...) любой длины сводятся к одному виду"""
+    return IN_LIST_RE.sub('(%s, ...)', sql)
+
+
+class QueryStats:
+    """execute_wrapper: число запросов и суммарное время SQL по исходному тексту запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.by_sql = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            entry = self.by_sql[sql]
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def shapes(self):
+        # Нормализация только по уникальным текстам запросов - дёшево даже при N+1
+        result = defaultdict(lambda: [0, 0.0])
+        for sql, (count, duration) in self.by_sql.items():
+            entry = result[query_shape(sql)]
+            entry[0] += count
+            entry[1] += duration
+        return result
+
+
+class QueryInstrumentationMiddleware:
+    """Считает SQL-запросы запроса, отдаёт Server-Timing и логирует медленные запросы и N+1"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = settings.SLOW_REQUEST_MS
+        self.duplicate_threshold = settings.QUERY_DUPLICATE_THRESHOLD
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with self.counting(stats):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        sql_ms = stats.duration * 1000
+
+        streaming = response.streaming and not getattr(response, 'is_async', False)
+        # Заголовки потокового ответа уходят до тела: запросы генератора (export) в заголовок
+        # не попадают, они досчитываются при отдаче тела и попадают в лог slow_request
+        response['Server-Timing'] = (
+            f'db;dur={sql_ms:.1f};desc="{stats.count} queries{" before streaming" if streaming else ""}", '
+            f'app;dur={total_ms - sql_ms:.1f}, total;dur={total_ms:.1f}'
+        )
+        if streaming:
+            response.streaming_content = self.count_stream(response.streaming_content, request, response, stats, start)
+        else:
+            self.log_slow(request, response, stats, total_ms)
+        return response
+
+    @staticmethod
+    def counting(stats):
+        stack = contextlib.ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        return stack
+
+    def count_stream(self, content, request, response, stats, start):
+        try:
+            with self.counting(stats):
+                yield from content
+        finally:
+            self.log_slow(request, response, stats, (time.perf_counter() - start) * 1000)
+
+    def log_slow(self, request, response, stats, total_ms):
+        sql_ms = stats.duration * 1000
+        shapes = stats.shapes()
+        duplicates = {shape: values for shape, values in shapes.items() if values[0] >= self.duplicate_threshold}
+        if total_ms >= self.slow_request_ms or duplicates:
+            top = sorted(shapes.items(), key=lambda item: item[1][1], reverse=True)[:5]
+            logger.warning('slow_request %s', json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'sql_ms': round(sql_ms, 1),
+                'queries': stats.count,
+                'duplicate_shapes': len(duplicates),
+                'top_queries': [
+                    {'sql': shape[:300], 'count': count, 'ms': round(duration * 1000, 1)}
+                    for shape, (count, duration) in top
+                ],
+            }, ensure_ascii=False))
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос через cProfile по флагу X-Profile / ?profile=1 от staff-пользователя"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request):
+            return self.get_response(request)
+
+        profiler = start_profiler()
+        if profiler is None:
+            return self.get_response(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            record = save_profile(profiler, 'request', f'{request.method} {request.get_full_path()}', duration_ms)
+            response['X-Profile-Id'] = str(record.pk)
+        except Exception as e:
+            logger.error(f"Failed to save profile for {request.path}: {e}")
+        return response
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        # Как compress_sequence в Django: каждый кусок уходит клиенту сразу, а не копится в буфере brotli
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжатие ответов: brotli, если клиент его принимает и пакет установлен, иначе gzip из Django"""
+
+    def process_response(self, request, response):
+        accepts_br = ACCEPTS_BR_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is None or not accepts_br or getattr(response, 'is_async', False):
+            return super().process_response(request, response)
+        if not response.streaming and len(response.content) < COMPRESS_MIN_LENGTH:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = brotli_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # Сжатое представление побайтно отличается от исходного - ETag становится слабым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class AdaptiveConcurrencyLimit:
+    """AIMD-лимит одновременных запросов процесса.
+
+    Пока запросы укладываются в целевую задержку, лимит растёт примерно на 1 за каждые
+    limit завершённых запросов; запрос дольше цели уменьшает лимит в decrease раз.
+    Запросы, начатые до последнего уменьшения, его не повторяют - иначе одна медленная
+    пачка обрушила бы лимит до минимума.
+    """
+
+    def __init__(self, initial, min_limit, max_limit, target_ms, decrease=0.7):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target = target_ms / 1000
+        self.decrease = decrease
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.decreased_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Момент начала запроса или None, если лимит исчерпан"""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return None
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def release(self, started):
+        """Учитывает задержку запроса; True, если лимит уменьшен"""
+        now = time.perf_counter()
+        with self._lock:
+            self.in_flight -= 1
+            if now - started <= self.target:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                return False
+            if started < self.decreased_at:
+                return False
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            self.decreased_at = now
+            return True
+
+
+class ConcurrencyLimitMiddleware:
+    """Сброс нагрузки: сверх адаптивного лимита одновременных запросов - сразу 429 с Retry-After.
+
+    Лимит свой у каждого процесса и имеет смысл при потоках (gunicorn --threads или runserver):
+    лишние запросы получают отказ, а не ждут в очереди, пока медленные освобождают потоки.
+    CONCURRENCY_TARGET_MS=0 выключает ограничение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.exempt_paths = tuple(settings.CONCURRENCY_EXEMPT_PATHS)
+        self.retry_after = str(settings.CONCURRENCY_RETRY_AFTER)
+        self.limiter = None
+        if settings.CONCURRENCY_TARGET_MS > 0:
+            self.limiter = AdaptiveConcurrencyLimit(
+                settings.CONCURRENCY_LIMIT_INITIAL,
+                settings.CONCURRENCY_LIMIT_MIN,
+                settings.CONCURRENCY_LIMIT_MAX,
+                settings.CONCURRENCY_TARGET_MS,
+            )
+
+    def __call__(self, request):
+        if self.limiter is None or request.path.startswith(self.exempt_paths):
+            return self.get_response(request)
+        started = self.limiter.acquire()
+        if started is None:
+            response = JsonResponse({'error': 'Server is overloaded, retry later'}, status=429)
+            response['Retry-After'] = self.retry_after
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            if self.limiter.release(started):
+                logger.warning(
+                    f"Concurrency limit lowered to {int(self.limiter.limit)} after slow {request.method} {request.path}"
+                )
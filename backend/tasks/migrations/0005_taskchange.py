@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_task_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('task_id', models.CharField(max_length=32)),
+                ('telegram_id', models.BigIntegerField(blank=True, null=True)),
+                ('kind', models.CharField(choices=[('created', 'Создана'), ('updated', 'Изменена'), ('deleted', 'Удалена')], max_length=16)),
+                ('changed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['telegram_id', 'seq'], name='taskchange_user_seq_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_taskchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('request', 'HTTP-запрос'), ('task', 'Celery-задача')], max_length=16)),
+                ('name', models.CharField(max_length=255)),
+                ('duration_ms', models.FloatField()),
+                ('file_name', models.CharField(max_length=100)),
+                ('size', models.PositiveIntegerField()),
+                ('summary', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
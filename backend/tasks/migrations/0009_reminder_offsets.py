@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:01
+
+import tasks.reminders
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_pending_reminders(apps, schema_editor):
+    # Пороги, пройденные до миграции, считаем отправленными: прежний check_upcoming_tasks
+    # уже напомнил о задачах ближайшего часа
+    Task = apps.get_model('tasks', 'Task')
+    now = timezone.now()
+    offsets = tasks.reminders.default_reminder_offsets()
+    batch = []
+    pending = Task.objects.filter(is_completed=False, notifications_disabled=False, due_date__gt=now)
+    for task in pending.only('id', 'due_date').iterator(chunk_size=2000):
+        task.last_reminder_at = now
+        task.next_reminder_at = tasks.reminders.next_reminder_at(task.due_date, offsets, now)
+        batch.append(task)
+        if len(batch) >= 2000:
+            Task.objects.bulk_update(batch, ['last_reminder_at', 'next_reminder_at'])
+            batch = []
+    Task.objects.bulk_update(batch, ['last_reminder_at', 'next_reminder_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_recurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtask',
+            name='reminder_offsets',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='last_reminder_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='reminder_offsets',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reminder_offsets',
+            field=models.JSONField(default=tasks.reminders.default_reminder_offsets),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('next_reminder_at__isnull', False)), fields=['next_reminder_at'], name='task_next_reminder_idx'),
+        ),
+        migrations.RunPython(schedule_pending_reminders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:26
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def seed_watermark(apps, schema_editor):
+    # Журнал мог уже чиститься по retention - всё до первой оставшейся записи считаем удалённым
+    TaskChange = apps.get_model('tasks', 'TaskChange')
+    TaskChangeWatermark = apps.get_model('tasks', 'TaskChangeWatermark')
+    first = TaskChange.objects.aggregate(first=Min('seq'))['first']
+    TaskChangeWatermark.objects.create(pk=1, purged_seq=first - 1 if first else 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_subtasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChangeWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purged_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_watermark, migrations.RunPython.noop),
+    ]
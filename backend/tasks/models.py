@@ -1,7 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 import hashlib
+import os
 import time
+import pytz
+from .reminders import default_reminder_offsets, next_reminder_at
+
+# Местное время бота: в нём вводятся и показываются дедлайны и считаются дни календаря
+LOCAL_TZ = pytz.timezone(settings.TIME_ZONE)
 
 
 class Category(models.Model):
@@ -24,6 +32,8 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     telegram_id = models.BigIntegerField(unique=True, null=True, blank=True)
     telegram_username = models.CharField(max_length=255, null=True, blank=True)
+    # Пороги напоминаний в минутах до дедлайна для задач без своих порогов
+    reminder_offsets = models.JSONField(default=default_reminder_offsets)
 
     def save(self, *args, **kwargs):
         if not self.id:
@@ -34,23 +44,236 @@ class UserProfile(models.Model):
     def __str__(self):
         return self.user.username
 
+# id задач - md5 в hex; path подзадачи - id её предков через '/', от корня к родителю
+TASK_ID_LENGTH = 32
+MAX_TASK_DEPTH = 50
+
+RECURRENCE_CHOICES = [
+    ('daily', 'Ежедневно'),
+    ('weekly', 'Еженедельно'),
+    ('monthly', 'Ежемесячно'),
+]
+
+
 class Task(models.Model):
     # PK: hash от заголовка, пользователя и времени создания
     id = models.CharField(primary_key=True, max_length=32, editable=False)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     due_date = models.DateTimeField()
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='tasks')
     categories = models.ManyToManyField(Category, related_name='tasks')
     is_completed = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(null=True, blank=True)
     notifications_disabled = models.BooleanField(default=False, help_text="Отключить уведомления для этой задачи")
+    # Повторение (подмножество RRULE: FREQ, INTERVAL, UNTIL, COUNT). В таблице хранится
+    # только текущее повторение серии, следующее создаётся при выполнении или просрочке
+    recurrence_freq = models.CharField(max_length=16, choices=RECURRENCE_CHOICES, blank=True, default='')
+    recurrence_interval = models.PositiveSmallIntegerField(default=1)
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+    recurrence_count = models.PositiveIntegerField(null=True, blank=True)
+    # Серия - id её первой задачи; дата повторения N считается от recurrence_anchor
+    series_id = models.CharField(max_length=32, null=True, blank=True)
+    occurrence_index = models.PositiveIntegerField(default=0)
+    recurrence_anchor = models.DateTimeField(null=True, blank=True)
+    # Следующее повторение уже создано: просроченное повторение больше не проверяется в check_due_tasks
+    superseded = models.BooleanField(default=False, editable=False)
+    # Свои пороги напоминаний (None - пороги профиля). next_reminder_at - ближайший
+    # неотправленный порог, last_reminder_at - момент последнего отправленного
+    reminder_offsets = models.JSONField(null=True, blank=True)
+    next_reminder_at = models.DateTimeField(null=True, blank=True)
+    last_reminder_at = models.DateTimeField(null=True, blank=True)
+    # Подзадачи (материализованный путь): поддерево, прогресс и выполнение поддерева -
+    # по одному запросу с условием path LIKE '<path родителя><id родителя>/%'
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    path = models.CharField(max_length=MAX_TASK_DEPTH * (TASK_ID_LENGTH + 1), blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Потомки задачи: подзадачи пользователя с префиксом path (varchar_pattern_ops - для LIKE)
+            models.Index(
+                fields=['user', 'path'],
+                name='task_subtree_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+                condition=models.Q(depth__gt=0),
+            ),
+            # Поиск кандидатов на архивацию: только выполненные задачи
+            models.Index(
+                fields=['completed_at'],
+                name='task_completed_at_idx',
+                condition=models.Q(is_completed=True),
+            ),
+            # Календарь и выборки задач пользователя по диапазону дедлайнов
+            models.Index(fields=['user', 'due_date'], name='task_user_due_idx'),
+            # Просроченные последние повторения серий для check_due_tasks
+            models.Index(
+                fields=['due_date'],
+                name='task_recurring_due_idx',
+                condition=models.Q(is_completed=False, superseded=False) & ~models.Q(recurrence_freq=''),
+            ),
+            # check_upcoming_tasks: один диапазонный запрос по всем порогам
+            models.Index(
+                fields=['next_reminder_at'],
+                name='task_next_reminder_idx',
+                condition=models.Q(next_reminder_at__isnull=False),
+            ),
+        ]
+        constraints = [
+            # Одно повторение серии создаётся ровно один раз, даже при гонке воркеров
+            models.UniqueConstraint(
+                fields=['series_id', 'occurrence_index'],
+                name='task_series_occurrence_uniq',
+                condition=models.Q(series_id__isnull=False),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.id:
             raw = f'{self.title}{self.user.id}{time.time()}'
             self.id = hashlib.md5(raw.encode()).hexdigest()
-        super().save(*args, **kwargs)
+        if self.recurrence_freq and not self.series_id:
+            self.start_series()
+        if self.is_completed and self.completed_at is None:
+            self.completed_at = timezone.now()
+        elif not self.is_completed:
+            self.completed_at = None
+        self.schedule_reminder()
+        old_path, old_depth = self.path, self.depth
+        if not self.place_in_tree():
+            super().save(*args, **kwargs)
+            return
+        from .subtasks import move_descendants
+        # Задачу перенесли в другое место дерева - её поддерево переезжает вместе с ней
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            move_descendants(self, old_path, old_depth)
+
+    def place_in_tree(self):
+        """path и depth по родителю; True, если уже сохранённую задачу перенесли в другое место дерева"""
+        # Последний сегмент path - id родителя, поэтому смена parent видна без запроса к БД
+        current_parent_id = self.path.rsplit('/', 2)[-2] if self.path else None
+        if current_parent_id == self.parent_id:
+            return False
+        if self.parent_id is None:
+            self.path, self.depth = '', 0
+        else:
+            self.path = f'{self.parent.path}{self.parent_id}/'
+            self.depth = self.parent.depth + 1
+        return not self._state.adding
+
+    def schedule_reminder(self):
+        if self.is_completed or self.notifications_disabled:
+            self.next_reminder_at = None
+            return
+        offsets = self.reminder_offsets if self.reminder_offsets is not None else self.user.reminder_offsets
+        self.next_reminder_at = next_reminder_at(self.due_date, offsets, self.last_reminder_at)
+
+    def start_series(self):
+        """Новая серия от этой задачи: повторения считаются от её дедлайна"""
+        self.series_id = self.id
+        self.occurrence_index = 0
+        self.recurrence_anchor = self.due_date
+        self.superseded = False
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedTask(models.Model):
+    # Выполненные задачи старше TASK_ARCHIVE_AFTER_DAYS; переносятся из Task с тем же id
+    id = models.CharField(primary_key=True, max_length=32, editable=False)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    due_date = models.DateTimeField()
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='archived_tasks')
+    categories = models.ManyToManyField(Category, related_name='archived_tasks')
+    is_completed = models.BooleanField(default=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    notifications_disabled = models.BooleanField(default=False)
+    recurrence_freq = models.CharField(max_length=16, choices=RECURRENCE_CHOICES, blank=True, default='')
+    recurrence_interval = models.PositiveSmallIntegerField(default=1)
+    recurrence_until = models.DateTimeField(null=True, blank=True)
+    recurrence_count = models.PositiveIntegerField(null=True, blank=True)
+    series_id = models.CharField(max_length=32, null=True, blank=True)
+    occurrence_index = models.PositiveIntegerField(default=0)
+    reminder_offsets = models.JSONField(null=True, blank=True)
+    # Родитель может ещё оставаться в Task, поэтому без FK
+    parent_id = models.CharField(max_length=32, null=True, blank=True)
+    depth = models.PositiveSmallIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'completed_at'], name='archivedtask_user_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class TaskChange(models.Model):
+    # Журнал изменений задач для инкрементальной синхронизации (курсор - seq)
+    KIND_CHOICES = [
+        ('created', 'Создана'),
+        ('updated', 'Изменена'),
+        ('deleted', 'Удалена'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    task_id = models.CharField(max_length=32)
+    # telegram_id, а не FK: строки журнала должны переживать удаление профиля в той же транзакции
+    telegram_id = models.BigIntegerField(null=True, blank=True)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['telegram_id', 'seq'], name='taskchange_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.seq}: {self.kind} {self.task_id}'
+
+
+class TaskChangeWatermark(models.Model):
+    # Одна строка: наибольший seq, удалённый из журнала по retention. Курсор меньше него
+    # требует полной пересборки копии, даже если журнал опустел целиком
+    purged_seq = models.BigIntegerField(default=0)
+
+    @classmethod
+    def purged(cls):
+        return cls.objects.filter(pk=1).values_list('purged_seq', flat=True).first() or 0
+
+    def __str__(self):
+        return f'purged through {self.purged_seq}'
+
+
+class ProfileRecord(models.Model):
+    # Профиль cProfile запроса или Celery-задачи; сам файл .prof лежит в PROFILE_DIR
+    KIND_CHOICES = [
+        ('request', 'HTTP-запрос'),
+        ('task', 'Celery-задача'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255)
+    duration_ms = models.FloatField()
+    file_name = models.CharField(max_length=100)
+    size = models.PositiveIntegerField()
+    summary = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def path(self):
+        return os.path.join(settings.PROFILE_DIR, self.file_name)
+
+    def __str__(self):
+        return f'{self.kind}: {self.name}'
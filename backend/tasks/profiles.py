@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from .models import UserProfile
+
+
+def get_or_create_telegram_profile(telegram_id, telegram_username=None, first_name='', last_name=''):
+    """Найти профиль по telegram_id или создать его вместе с User"""
+    profile = UserProfile.objects.filter(telegram_id=telegram_id).first()
+    if profile:
+        return profile, False
+    # Создаём User
+    user, _ = User.objects.get_or_create(
+        username=f'tg_{telegram_id}',
+        defaults={
+            'email': f'{telegram_id}@tg.local',
+            'first_name': first_name,
+            'last_name': last_name,
+        }
+    )
+    # Создаём профиль
+    profile = UserProfile.objects.create(
+        user=user,
+        telegram_id=telegram_id,
+        telegram_username=telegram_username
+    )
+    return profile, True
@@ -0,0 +1,87 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import time
+import uuid
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_LINES = 40
+
+_task_profiles = {}
+
+
+def start_profiler():
+    """Запускает cProfile; None, если в потоке уже работает другой профилировщик"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def save_profile(profiler, kind, name, duration_ms):
+    """Сохраняет профиль на диск (PROFILE_DIR) и создаёт запись для админки"""
+    from .models import ProfileRecord
+
+    profiler.disable()
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    file_name = f'{timezone.now():%Y%m%d-%H%M%S}-{kind}-{uuid.uuid4().hex[:8]}.prof'
+    path = os.path.join(settings.PROFILE_DIR, file_name)
+    profiler.dump_stats(path)
+
+    summary = io.StringIO()
+    pstats.Stats(path, stream=summary).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    return ProfileRecord.objects.create(
+        kind=kind,
+        name=name[:255],
+        duration_ms=duration_ms,
+        file_name=file_name,
+        size=os.path.getsize(path),
+        summary=summary.getvalue(),
+    )
+
+
+def wants_profile(request):
+    """Профилирование запроса: X-Profile: 1 или ?profile=1, только для staff"""
+    if request.headers.get('X-Profile') != '1' and request.GET.get('profile') != '1':
+        return False
+    return request.user.is_authenticated and request.user.is_staff
+
+
+@task_prerun.connect
+def start_task_profile(task_id=None, **kwargs):
+    rate = settings.CELERY_PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        profiler = start_profiler()
+        if profiler is not None:
+            _task_profiles[task_id] = (profiler, time.perf_counter())
+
+
+@task_postrun.connect
+def finish_task_profile(task_id=None, task=None, **kwargs):
+    entry = _task_profiles.pop(task_id, None)
+    if entry is None:
+        return
+    profiler, started = entry
+    try:
+        save_profile(profiler, 'task', task.name, (time.perf_counter() - started) * 1000)
+    except Exception as e:
+        logger.error(f"Failed to save profile for task {task.name}: {e}")
+
+
+@receiver(post_delete, sender='tasks.ProfileRecord')
+def remove_profile_file(sender, instance, **kwargs):
+    try:
+        os.remove(instance.path)
+    except FileNotFoundError:
+        pass
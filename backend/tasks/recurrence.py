@@ -0,0 +1,148 @@
+import calendar
+import logging
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import Task, LOCAL_TZ
+
+logger = logging.getLogger(__name__)
+
+# Повторения сохраняют местное время дедлайна (LOCAL_TZ, как его ввёл пользователь) и при переходе на летнее время
+DAYS_PER_STEP = {'daily': 1, 'weekly': 7}
+
+
+def occurrence_at(anchor, freq, interval, index):
+    """Дедлайн повторения index за O(1), без перебора предыдущих повторений.
+
+    Ежемесячные повторения считаются от дня якоря: 31-е число в коротком месяце
+    становится последним днём месяца, а в следующем снова 31-м.
+    """
+    local = anchor.astimezone(LOCAL_TZ).replace(tzinfo=None)
+    try:
+        if freq == 'monthly':
+            months = local.month - 1 + index * interval
+            year, month = local.year + months // 12, months % 12 + 1
+            day = min(local.day, calendar.monthrange(year, month)[1])
+            naive = local.replace(year=year, month=month, day=day)
+        else:
+            naive = local + timedelta(days=index * interval * DAYS_PER_STEP[freq])
+    except (ValueError, OverflowError):
+        # За пределами datetime.MAXYEAR повторений нет
+        return None
+    return LOCAL_TZ.localize(naive)
+
+
+def first_index_after(anchor, freq, interval, moment):
+    """Номер первого повторения с дедлайном позже moment за O(1).
+
+    Номер оценивается делением, а затем поправляется на пару шагов:
+    переход на летнее время сдвигает повторения не больше чем на час.
+    """
+    local = anchor.astimezone(LOCAL_TZ).replace(tzinfo=None)
+    target = moment.astimezone(LOCAL_TZ).replace(tzinfo=None)
+    if target < local:
+        return 0
+    if freq == 'monthly':
+        index = ((target.year - local.year) * 12 + target.month - local.month) // interval
+    else:
+        index = (target - local).days // (interval * DAYS_PER_STEP[freq])
+    while index > 0 and _after(occurrence_at(anchor, freq, interval, index - 1), moment):
+        index -= 1
+    while not _after(occurrence_at(anchor, freq, interval, index), moment):
+        index += 1
+    return index
+
+
+def _after(due_date, moment):
+    # None - повторение за пределами календаря, считаем его бесконечно далёким
+    return due_date is None or due_date > moment
+
+
+def in_series(task, index, due_date):
+    if due_date is None:
+        return False
+    if task.recurrence_count is not None and index >= task.recurrence_count:
+        return False
+    return task.recurrence_until is None or due_date <= task.recurrence_until
+
+
+def next_occurrence(task, now=None):
+    """(номер, дедлайн) следующего повторения после task или None, если серия закончилась.
+
+    Пропущенные повторения не создаются: если задачу выполнили поздно, следующим
+    становится первое повторение с дедлайном в будущем.
+    """
+    if not task.recurrence_freq or task.recurrence_anchor is None:
+        return None
+    now = now or timezone.now()
+    index = max(
+        task.occurrence_index + 1,
+        first_index_after(task.recurrence_anchor, task.recurrence_freq, task.recurrence_interval, now),
+    )
+    due_date = occurrence_at(task.recurrence_anchor, task.recurrence_freq, task.recurrence_interval, index)
+    if not in_series(task, index, due_date):
+        return None
+    return index, due_date
+
+
+def materialize_next(task, now=None):
+    """Создаёт следующее повторение серии, если task - последнее созданное. Возвращает новую задачу или None"""
+    # У серии всегда одно незавершённое повторение: более позднее уже может быть создано сканированием
+    if Task.objects.filter(series_id=task.series_id, occurrence_index__gt=task.occurrence_index).exists():
+        return None
+    return create_occurrence(task, now)
+
+
+def create_occurrence(task, now=None):
+    upcoming = next_occurrence(task, now)
+    if upcoming is None:
+        return None
+    index, due_date = upcoming
+    try:
+        with transaction.atomic():
+            occurrence = Task(
+                title=task.title,
+                description=task.description,
+                due_date=due_date,
+                user=task.user,
+                notifications_disabled=task.notifications_disabled,
+                recurrence_freq=task.recurrence_freq,
+                recurrence_interval=task.recurrence_interval,
+                recurrence_until=task.recurrence_until,
+                recurrence_count=task.recurrence_count,
+                series_id=task.series_id,
+                occurrence_index=index,
+                recurrence_anchor=task.recurrence_anchor,
+                parent_id=task.parent_id,
+            )
+            occurrence.save()
+            occurrence.categories.set(task.categories.all())
+            # Служебная отметка без событий: предыдущие повторения выпадают из сканирования
+            Task.objects.filter(
+                series_id=task.series_id, occurrence_index__lt=index, superseded=False,
+            ).update(superseded=True)
+    except IntegrityError:
+        # Параллельный воркер уже создал это повторение
+        return None
+    logger.info(f"Materialized occurrence {index} of series {task.series_id}")
+    return occurrence
+
+
+def materialize_overdue(tasks, now=None):
+    """Следующие повторения для просроченных задач серий: одна проверка на всю пачку"""
+    recurring = [task for task in tasks if task.recurrence_freq and task.series_id]
+    if not recurring:
+        return []
+    latest = dict(
+        Task.objects.filter(series_id__in={task.series_id for task in recurring})
+        .values('series_id').annotate(latest=Max('occurrence_index')).values_list('series_id', 'latest')
+    )
+    created = []
+    for task in recurring:
+        if latest.get(task.series_id) != task.occurrence_index:
+            continue
+        occurrence = create_occurrence(task, now)
+        if occurrence is not None:
+            created.append(occurrence)
+    return created
@@ -0,0 +1,16 @@
+import redis
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    """Общий клиент Redis (создаётся при первом обращении)"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=2,
+            socket_connect_timeout=2,
+        )
+    return _client
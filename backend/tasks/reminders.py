@@ -0,0 +1,70 @@
+from datetime import timedelta
+from django.conf import settings
+
+# Пороги напоминаний - минуты до дедлайна, например [1440, 60, 10]: за сутки, за час и за 10 минут
+MAX_REMINDER_OFFSETS = 10
+MAX_REMINDER_OFFSET_MINUTES = 30 * 24 * 60
+
+
+def default_reminder_offsets():
+    return list(settings.DEFAULT_REMINDER_OFFSETS)
+
+
+def normalize_offsets(offsets):
+    """Уникальные пороги по убыванию; ValueError при неверном значении"""
+    if not isinstance(offsets, (list, tuple)):
+        raise ValueError('Пороги напоминаний - список минут до дедлайна')
+    if len(offsets) > MAX_REMINDER_OFFSETS:
+        raise ValueError(f'Не больше {MAX_REMINDER_OFFSETS} порогов')
+    result = set()
+    for offset in offsets:
+        if isinstance(offset, bool) or not isinstance(offset, int) or not 0 < offset <= MAX_REMINDER_OFFSET_MINUTES:
+            raise ValueError(f'Порог должен быть целым числом минут от 1 до {MAX_REMINDER_OFFSET_MINUTES}')
+        result.add(offset)
+    return sorted(result, reverse=True)
+
+
+def threshold_times(due_date, offsets):
+    """Моменты срабатывания порогов по возрастанию"""
+    return sorted(due_date - timedelta(minutes=offset) for offset in offsets)
+
+
+def next_reminder_at(due_date, offsets, last_reminder_at=None):
+    """Ближайший ещё не отправленный порог: первый, который позже последнего отправленного.
+
+    Маркер - момент, а не номер порога: если дедлайн перенесли позже, его пороги
+    снова оказываются после маркера и напоминания придут заново.
+    """
+    for moment in threshold_times(due_date, offsets):
+        if last_reminder_at is None or moment > last_reminder_at:
+            return moment
+    return None
+
+
+def crossed_threshold(due_date, offsets, last_reminder_at, now):
+    """Последний из порогов, пройденных с прошлой отправки, или None.
+
+    Если с прошлого запуска пройдено несколько порогов (задачу создали за 5 минут
+    до дедлайна), отправляется одно напоминание - по самому позднему.
+    """
+    crossed = None
+    for moment in threshold_times(due_date, offsets):
+        if moment > now:
+            break
+        if last_reminder_at is None or moment > last_reminder_at:
+            crossed = moment
+    return crossed
+
+
+def reschedule_profile_reminders(profile, batch_size=1000):
+    """Пересчёт next_reminder_at задач профиля без своих порогов после смены порогов профиля"""
+    from .models import Task
+
+    tasks = list(
+        profile.tasks.filter(is_completed=False, notifications_disabled=False, reminder_offsets__isnull=True)
+        .only('id', 'due_date', 'last_reminder_at', 'next_reminder_at')
+    )
+    for task in tasks:
+        task.next_reminder_at = next_reminder_at(task.due_date, profile.reminder_offsets, task.last_reminder_at)
+    Task.objects.bulk_update(tasks, ['next_reminder_at'], batch_size=batch_size)
+    return len(tasks)
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+
+def ndjson_line(row):
+    return json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: writerow возвращает строку вместо записи в буфер"""
+
+    def write(self, value):
+        return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Один JSON-объект на строку; объявлен, чтобы ?format=ndjson проходил согласование формата"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_line(row) for row in rows).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV с заголовком из ключей первой строки (используется для ответов с ошибками экспорта)"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack: компактнее JSON и быстрее разбирается на стороне бота"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Даты и Decimal сериализатор уже превратил в строки; остальное - на всякий случай через str
+        return msgpack.packb(data, use_bin_type=True, default=str)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData) as e:
+            raise ParseError(f'MessagePack parse error - {e}')
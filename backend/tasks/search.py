@@ -0,0 +1,117 @@
+from django.db.models import Count, Q
+from .importer import RowError, parse_due_date
+from .models import Task
+
+STATES = ('open', 'overdue', 'completed')
+MATCH_MODES = ('any', 'all')
+# Больше категорий в фильтре не бывает на практике, а каждая добавляет подзапрос
+MAX_FILTER_CATEGORIES = 20
+
+
+class SearchError(ValueError):
+    pass
+
+
+def state_q(state, now):
+    if state == 'completed':
+        return Q(is_completed=True)
+    if state == 'overdue':
+        return Q(is_completed=False, due_date__lt=now)
+    return Q(is_completed=False, due_date__gte=now)
+
+
+def in_categories(category_ids):
+    return Q(id__in=Task.categories.through.objects.filter(category_id__in=category_ids).values('task_id'))
+
+
+def parse_list(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+class TaskSearch:
+    """Фасетный поиск: ?categories=a,b&match=any|all&due_from=&due_to=&state=open,overdue.
+
+    Фасеты считаются одним агрегатным запросом по задачам без фильтров по категориям
+    и состоянию - фильтры входят в условия FILTER отдельных счётчиков. Поэтому счётчик
+    категории или состояния показывает, сколько задач будет найдено, если выбрать его
+    (для match=all - сколько останется после добавления категории к выбранным).
+    """
+
+    def __init__(self, query_params, now):
+        self.now = now
+        self.categories = parse_list(query_params.get('categories'))
+        if len(self.categories) > MAX_FILTER_CATEGORIES:
+            raise SearchError(f'Too many categories (max {MAX_FILTER_CATEGORIES})')
+        self.match = query_params.get('match', 'any')
+        if self.match not in MATCH_MODES:
+            raise SearchError(f'match must be one of: {", ".join(MATCH_MODES)}')
+        self.states = parse_list(query_params.get('state'))
+        unknown = set(self.states) - set(STATES)
+        if unknown:
+            raise SearchError(f'Unknown state: {", ".join(sorted(unknown))}')
+        self.due_from = self.parse_date(query_params, 'due_from')
+        self.due_to = self.parse_date(query_params, 'due_to')
+
+    @staticmethod
+    def parse_date(query_params, name):
+        # Те же форматы, что и при импорте: 'YYYY-MM-DD HH:MM' (местное время) или ISO 8601
+        value = query_params.get(name)
+        if not value:
+            return None
+        try:
+            return parse_due_date(value)
+        except RowError:
+            raise SearchError(f'invalid {name}: {value}')
+
+    def base(self, queryset):
+        """Задачи без фильтров по категориям и состоянию"""
+        if self.due_from:
+            queryset = queryset.filter(due_date__gte=self.due_from)
+        if self.due_to:
+            queryset = queryset.filter(due_date__lte=self.due_to)
+        return queryset
+
+    def category_q(self):
+        if not self.categories:
+            return Q()
+        if self.match == 'any':
+            return in_categories(self.categories)
+        condition = Q()
+        for category_id in self.categories:
+            condition &= in_categories([category_id])
+        return condition
+
+    def states_q(self):
+        condition = Q()
+        for state in self.states:
+            condition |= state_q(state, self.now)
+        return condition
+
+    def results(self, queryset):
+        return self.base(queryset).filter(self.category_q() & self.states_q())
+
+    def facets(self, queryset, category_ids):
+        """Счётчики по всем категориям и состояниям одним запросом"""
+        matched = self.category_q() & self.states_q()
+        # Счётчики категорий идут по JOIN со связями: строка (задача, категория) уникальна,
+        # поэтому им DISTINCT не нужен, а общий счётчик и счётчики состояний - с DISTINCT
+        aggregates = {
+            'total': Count('id', filter=matched, distinct=True),
+        }
+        for index, state in enumerate(STATES):
+            aggregates[f'state_{index}'] = Count(
+                'id', filter=self.category_q() & state_q(state, self.now), distinct=True
+            )
+        for index, category_id in enumerate(category_ids):
+            condition = Q(categories__id=category_id) & self.states_q()
+            if self.match == 'all':
+                condition &= self.category_q()
+            # Для match=any фасет дизъюнктивный: категория без учёта выбора остальных
+            aggregates[f'category_{index}'] = Count('id', filter=condition)
+        counts = self.base(queryset).order_by().aggregate(**aggregates)
+        return counts['total'], {
+            'state': {state: counts[f'state_{index}'] for index, state in enumerate(STATES)},
+            'categories': {
+                category_id: counts[f'category_{index}'] for index, category_id in enumerate(category_ids)
+            },
+        }
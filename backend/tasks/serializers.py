@@ -1,16 +1,64 @@
 from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject
+from django.db import models
 from django.contrib.auth.models import User
-from .models import Task, Category, UserProfile
+from .models import Task, Category, UserProfile, ArchivedTask, LOCAL_TZ, MAX_TASK_DEPTH
+from .recurrence import next_occurrence
+from .reminders import normalize_offsets, reschedule_profile_reminders
+from .subtasks import subtask_progress, subtree_height
 from datetime import datetime
 from django.utils import timezone
-import pytz
+
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """?fields=a,b оставляет только перечисленные поля, ?omit=c убирает поля.
+
+    Лишние поля удаляются из сериализатора до обработки строк, поэтому их
+    SerializerMethodField не вычисляются. Применяется только к GET-запросам,
+    чтобы не мешать валидации при записи.
+    """
+
+    @classmethod
+    def sparse_field_names(cls, request):
+        """Имена полей, которые попадут в ответ на этот запрос"""
+        names = set(cls.Meta.fields)
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return names
+        fields = parse_field_list(request.query_params.get('fields'))
+        if fields:
+            names &= fields
+        return names - parse_field_list(request.query_params.get('omit'))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+        keep = self.sparse_field_names(request)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+def validate_reminder_offsets(value):
+    if value is None:
+        return None
+    try:
+        return normalize_offsets(value)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     task_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -20,49 +68,135 @@ class CategorySerializer(serializers.ModelSerializer):
     def get_task_count(self, obj):
         return obj.tasks.count()
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     task_count = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
-        fields = ['id', 'user', 'telegram_id', 'telegram_username', 'task_count']
+        fields = ['id', 'user', 'telegram_id', 'telegram_username', 'task_count', 'reminder_offsets']
 
     def get_task_count(self, obj):
         return obj.tasks.count()
 
-class TaskSerializer(serializers.ModelSerializer):
+    def validate_reminder_offsets(self, value):
+        if value is None:
+            raise serializers.ValidationError('Укажите список порогов')
+        return validate_reminder_offsets(value)
+
+    def update(self, instance, validated_data):
+        offsets_changed = (
+            'reminder_offsets' in validated_data
+            and validated_data['reminder_offsets'] != instance.reminder_offsets
+        )
+        instance = super().update(instance, validated_data)
+        if offsets_changed:
+            reschedule_profile_reminders(instance)
+        return instance
+
+class TaskListSerializer(serializers.ListSerializer):
+    """Прогресс подзадач считается одним запросом на весь список, а не на каждую задачу"""
+
+    def to_representation(self, data):
+        data = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if 'progress' in self.child.fields and 'subtask_progress' not in self.context:
+            self.context['subtask_progress'] = subtask_progress(data)
+        return super().to_representation(data)
+
+
+class ParentField(serializers.PrimaryKeyRelatedField):
+    """Родитель задачи; у ArchivedTask он хранится простым parent_id без FK"""
+
+    def get_attribute(self, instance):
+        if isinstance(instance, ArchivedTask):
+            return PKOnlyObject(pk=instance.parent_id) if instance.parent_id else None
+        return super().get_attribute(instance)
+
+
+class TaskSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     categories = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), many=True)
     user = serializers.PrimaryKeyRelatedField(queryset=UserProfile.objects.all())
     category_names = serializers.SerializerMethodField()
     user_info = serializers.SerializerMethodField()
     is_overdue = serializers.SerializerMethodField()
+    is_archived = serializers.SerializerMethodField()
+    recurrence_interval = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    next_occurrence = serializers.SerializerMethodField()
+    parent = ParentField(queryset=Task.objects.all(), allow_null=True, required=False)
+    progress = serializers.SerializerMethodField()
+
+    # Поля правила повторения: их изменение начинает серию заново от текущего дедлайна
+    RECURRENCE_FIELDS = ('recurrence_freq', 'recurrence_interval', 'recurrence_until', 'recurrence_count')
+    LOCAL_DATE_FIELDS = ('due_date', 'recurrence_until')
 
     class Meta:
         model = Task
         fields = [
             'id', 'title', 'description', 'created_at', 'due_date',
             'user', 'categories', 'is_completed', 'category_names',
-            'user_info', 'is_overdue', 'notifications_disabled'
+            'user_info', 'is_overdue', 'notifications_disabled',
+            'completed_at', 'is_archived',
+            'recurrence_freq', 'recurrence_interval', 'recurrence_until', 'recurrence_count',
+            'series_id', 'occurrence_index', 'next_occurrence', 'reminder_offsets',
+            'parent', 'depth', 'progress',
         ]
+        read_only_fields = ['completed_at', 'series_id', 'occurrence_index', 'depth']
+        list_serializer_class = TaskListSerializer
 
     def to_internal_value(self, data):
-        value = data.get('due_date')
         # Формат: 'YYYY-MM-DD HH:MM'   :
-        if value and isinstance(value, str) and len(value) == 16:
-            local_tz = pytz.timezone('America/Adak')
-            dt = datetime.strptime(value, '%Y-%m-%d %H:%M')
-            aware_dt = local_tz.localize(dt)
-            data['due_date'] = aware_dt.isoformat()
+        for field in self.LOCAL_DATE_FIELDS:
+            value = data.get(field)
+            if value and isinstance(value, str) and len(value) == 16:
+                dt = datetime.strptime(value, '%Y-%m-%d %H:%M')
+                aware_dt = LOCAL_TZ.localize(dt)
+                data[field] = aware_dt.isoformat()
         return super().to_internal_value(data)
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        # Всегда возвращаем due_date в формате 'YYYY-MM-DD HH:MM'
-        if instance.due_date:
-            rep['due_date'] = instance.due_date.astimezone(pytz.timezone('America/Adak')).strftime('%Y-%m-%d %H:%M')
+        # Всегда возвращаем даты в формате 'YYYY-MM-DD HH:MM'
+        for field in self.LOCAL_DATE_FIELDS:
+            value = getattr(instance, field)
+            if value and field in rep:
+                rep[field] = value.astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M')
         return rep
 
+    def validate_reminder_offsets(self, value):
+        return validate_reminder_offsets(value)
+
+    def validate(self, attrs):
+        until = attrs.get('recurrence_until', getattr(self.instance, 'recurrence_until', None))
+        count = attrs.get('recurrence_count', getattr(self.instance, 'recurrence_count', None))
+        if until is not None and count is not None:
+            raise serializers.ValidationError('Укажите либо recurrence_until, либо recurrence_count')
+        if attrs.get('parent') is not None:
+            self.validate_parent_task(attrs['parent'], attrs.get('user', getattr(self.instance, 'user', None)))
+        return attrs
+
+    def validate_parent_task(self, parent, user):
+        if user is not None and parent.user_id != user.id:
+            raise serializers.ValidationError({'parent': 'Родительская задача принадлежит другому пользователю'})
+        height = 0
+        if self.instance is not None:
+            if parent.id == self.instance.id or self.instance.id in parent.path.split('/'):
+                raise serializers.ValidationError({'parent': 'Задачу нельзя сделать подзадачей её же поддерева'})
+            if parent.id != self.instance.parent_id:
+                height = subtree_height(self.instance)
+        if parent.depth + 1 + height > MAX_TASK_DEPTH:
+            raise serializers.ValidationError({'parent': f'Вложенность подзадач - не больше {MAX_TASK_DEPTH} уровней'})
+
+    def update(self, instance, validated_data):
+        changed = any(
+            field in validated_data and validated_data[field] != getattr(instance, field)
+            for field in self.RECURRENCE_FIELDS + ('due_date',)
+        )
+        instance = super().update(instance, validated_data)
+        if changed and instance.recurrence_freq:
+            instance.start_series()
+            instance.save(update_fields=['series_id', 'occurrence_index', 'recurrence_anchor', 'superseded'])
+        return instance
+
     def get_category_names(self, obj):
         return [cat.name for cat in obj.categories.all()]
 
@@ -75,3 +209,28 @@ class TaskSerializer(serializers.ModelSerializer):
 
     def get_is_overdue(self, obj):
         return not obj.is_completed and obj.due_date < timezone.now()
+
+    def get_is_archived(self, obj):
+        # Список с ?include_archived=1 содержит и объекты ArchivedTask
+        return isinstance(obj, ArchivedTask)
+
+    def get_progress(self, obj):
+        # Доля выполненных подзадач всех уровней; None - подзадач нет
+        if isinstance(obj, ArchivedTask):
+            return None
+        progress = self.context.get('subtask_progress')
+        if progress is None:
+            progress = subtask_progress([obj])
+        done, total = progress.get(obj.id, (0, 0))
+        if not total:
+            return None
+        return {'done': done, 'total': total, 'percent': round(done * 100 / total)}
+
+    def get_next_occurrence(self, obj):
+        # Считается по правилу за O(1); в БД следующее повторение появится позже
+        if isinstance(obj, ArchivedTask):
+            return None
+        upcoming = next_occurrence(obj)
+        if upcoming is None:
+            return None
+        return upcoming[1].astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M')
@@ -0,0 +1,85 @@
+import contextlib
+import contextvars
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Task, Category, UserProfile
+from .events import record_changes
+
+_task_signals_muted = contextvars.ContextVar('task_signals_muted', default=False)
+
+
+@contextlib.contextmanager
+def mute_task_signals():
+    """Отключает события по отдельным задачам - для пакетных операций, которые вызывают record_changes сами"""
+    token = _task_signals_muted.set(True)
+    try:
+        yield
+    finally:
+        _task_signals_muted.reset(token)
+
+
+def task_telegram_id(task):
+    try:
+        return task.user.telegram_id
+    except UserProfile.DoesNotExist:
+        return None
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, **kwargs):
+    if _task_signals_muted.get():
+        return
+    kind = 'task.created' if created else 'task.updated'
+    record_changes([(kind, instance.id, task_telegram_id(instance))])
+    # Выполненное повторение серии - создаём следующее
+    if instance.is_completed and instance.recurrence_freq:
+        from .recurrence import materialize_next
+        materialize_next(instance)
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    if _task_signals_muted.get():
+        return
+    record_changes([('task.deleted', instance.id, task_telegram_id(instance))])
+
+
+@receiver(m2m_changed, sender=Task.categories.through)
+def task_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # category.tasks.clear() передаёт pk_set=None - задачи запоминаем до удаления связей
+        instance._cleared_task_events = list(
+            Task.objects.filter(categories=instance).values_list('id', 'user__telegram_id')
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        record_changes([('task.updated', instance.id, task_telegram_id(instance))])
+    elif action == 'post_clear':
+        tasks = instance.__dict__.pop('_cleared_task_events', [])
+        record_changes(('task.updated', task_id, telegram_id) for task_id, telegram_id in tasks)
+    elif pk_set:
+        tasks = Task.objects.filter(id__in=pk_set).values_list('id', 'user__telegram_id')
+        record_changes(('task.updated', task_id, telegram_id) for task_id, telegram_id in tasks)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    record_changes([('category.created' if created else 'category.updated', instance.id, None)])
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    record_changes([('category.deleted', instance.id, None)])
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, created, **kwargs):
+    kind = 'profile.created' if created else 'profile.updated'
+    record_changes([(kind, instance.id, instance.telegram_id)])
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    record_changes([('profile.deleted', instance.id, instance.telegram_id)])
@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+from .models import Task, TASK_ID_LENGTH
+
+
+def descendants_prefix(task):
+    """Начало path у всех потомков task"""
+    return f'{task.path}{task.id}/'
+
+
+def descendants_of(task):
+    """Все потомки task одним запросом по индексу (user, path)"""
+    # depth__gt=0 и user совпадают с условием частичного индекса task_subtree_idx
+    return Task.objects.filter(user_id=task.user_id, depth__gt=0, path__startswith=descendants_prefix(task))
+
+
+def subtree_height(task):
+    """Глубина самого глубокого потомка относительно task (0 - потомков нет)"""
+    deepest = descendants_of(task).aggregate(depth=Max('depth'))['depth']
+    return 0 if deepest is None else deepest - task.depth
+
+
+def rollup(rows, task_ids):
+    """{id: (выполнено, всего)} по потомкам для задач task_ids из строк (path, is_completed)"""
+    counts = {}
+    for path, is_completed in rows:
+        for ancestor_id in path.split('/')[:-1]:
+            if ancestor_id in task_ids:
+                done, total = counts.get(ancestor_id, (0, 0))
+                counts[ancestor_id] = (done + is_completed, total + 1)
+    return counts
+
+
+def subtask_progress(tasks):
+    """Прогресс по всем уровням подзадач для списка задач - один запрос на весь список.
+
+    Потомки задачи лежат в том же дереве, что и она, поэтому достаточно выбрать
+    подзадачи деревьев из списка (корень - первый сегмент path) и сложить их по предкам.
+    """
+    tasks = [task for task in tasks if isinstance(task, Task)]
+    if not tasks:
+        return {}
+    roots = {task.path[:TASK_ID_LENGTH] or task.id for task in tasks}
+    rows = (
+        Task.objects.filter(user_id__in={task.user_id for task in tasks}, depth__gt=0)
+        .annotate(root=Substr('path', 1, TASK_ID_LENGTH))
+        .filter(root__in=roots)
+        .values_list('path', 'is_completed')
+    )
+    return rollup(rows, {task.id for task in tasks})
+
+
+def move_descendants(task, old_path, old_depth):
+    """Переносит потомков вслед за task одним UPDATE; возвращает их id"""
+    from .events import record_changes
+
+    old_prefix = f'{old_path}{task.id}/'
+    descendants = Task.objects.filter(user_id=task.user_id, depth__gt=0, path__startswith=old_prefix)
+    ids = list(descendants.values_list('id', flat=True))
+    if ids:
+        descendants.update(
+            path=Concat(Value(descendants_prefix(task)), Substr('path', len(old_prefix) + 1)),
+            depth=F('depth') + (task.depth - old_depth),
+            updated_at=timezone.now(),
+        )
+        record_changes(('task.updated', task_id, task.user.telegram_id) for task_id in ids)
+    return ids
+
+
+def complete_subtree(task, now=None):
+    """Выполняет task вместе со всеми потомками: потомки - одним UPDATE. Возвращает их число"""
+    from .events import record_changes
+    from .recurrence import materialize_overdue
+
+    now = now or timezone.now()
+    pending = descendants_of(task).filter(is_completed=False)
+    with transaction.atomic():
+        rows = list(pending.values_list('id', 'recurrence_freq'))
+        # Повторяющиеся подзадачи нужны целиком - для их следующих повторений
+        recurring = list(Task.objects.filter(id__in=[task_id for task_id, freq in rows if freq]))
+        if rows:
+            pending.update(
+                is_completed=True, completed_at=now, next_reminder_at=None, updated_at=now,
+            )
+            # update() не вызывает post_save - события публикуем сами
+            telegram_id = task.user.telegram_id
+            record_changes(('task.updated', task_id, telegram_id) for task_id, _ in rows)
+        task.is_completed = True
+        task.save()
+        # Та же пакетная проверка, что и для просроченных повторений
+        materialize_overdue(recurring, now)
+    return len(rows)
@@ -4,7 +4,9 @@ from django.utils import timezone
 from django.conf import settings
 import requests
 import logging
-import pytz
+from .locks import single_run
+from todo_backend.db_router import scan_reads
+from .metrics import SCAN_IN_PROGRESS, SCAN_ROWS_MATCHED, SCAN_SKIPPED, record_notification
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +18,7 @@ def send_telegram_notification(telegram_id, message, inline_keyboard=None):
             logger.error("BOT_TOKEN not configured in settings")
             return False
 
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        url = f"{settings.TELEGRAM_API_URL}/bot{bot_token}/sendMessage"
         data = {
             'chat_id': telegram_id,
             'text': message,
@@ -42,13 +44,13 @@ def send_telegram_notification(telegram_id, message, inline_keyboard=None):
 
 def notify_user_about_due_task(task):
     """Уведомление пользователя о просроченной задаче"""
+    from .models import LOCAL_TZ
     try:
         if not task.user or not task.user.telegram_id:
             logger.warning(f"Task {task.id} has no user or telegram_id")
             return False
-        # Конвертируем в локальное время America/Adak
-        local_tz = pytz.timezone('America/Adak')
-        due_date_local = task.due_date.astimezone(local_tz)
+        # Конвертируем в местное время
+        due_date_local = task.due_date.astimezone(LOCAL_TZ)
         due_date_str = due_date_local.strftime('%Y-%m-%d %H:%M')
         now = timezone.now()
         overdue_duration = now - task.due_date
@@ -81,18 +83,18 @@ def notify_user_about_due_task(task):
 
 def notify_user_about_upcoming_task(task):
     """Уведомление пользователя о приближающемся дедлайне"""
+    from .models import LOCAL_TZ
     try:
         if not task.user or not task.user.telegram_id:
             logger.warning(f"Task {task.id} has no user or telegram_id")
             return False
-        # Конвертируем в локальное время America/Adak
-        local_tz = pytz.timezone('America/Adak')
-        due_date_local = task.due_date.astimezone(local_tz)
+        # Конвертируем в местное время
+        due_date_local = task.due_date.astimezone(LOCAL_TZ)
         due_date_str = due_date_local.strftime('%Y-%m-%d %H:%M')
         time_until_due = task.due_date - timezone.now()
         hours_until_due = time_until_due.total_seconds() / 3600
-        if hours_until_due <= 1:
-            time_text = "менее часа"
+        if hours_until_due < 1:
+            time_text = f"{max(1, int(time_until_due.total_seconds() // 60))} мин"
         elif hours_until_due <= 24:
             time_text = f"{int(hours_until_due)} часов"
         else:
@@ -124,64 +126,127 @@ def check_due_tasks():
     """Проверка просроченных задач"""
     from .models import Task
 
-    now = timezone.now()
-    due_tasks = Task.objects.filter(
-        due_date__lte=now,
-        is_completed=False,
-        notifications_disabled=False  # Исключаем задачи с отключенными уведомлениями
-    ).select_related('user').prefetch_related('categories')
-
-    logger.info(f"Found {due_tasks.count()} overdue tasks with notifications enabled")
-
-    for task in due_tasks:
-        success = notify_user_about_due_task(task)
-        if success:
-            logger.info(f"Successfully notified user about overdue task {task.id}")
-        else:
-            logger.error(f"Failed to notify user about overdue task {task.id}")
+    with single_run('check_due_tasks', settings.SCAN_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            logger.warning("check_due_tasks is still running, skipping this run")
+            SCAN_SKIPPED.labels(scan='due').inc()
+            return
+        with SCAN_IN_PROGRESS.labels(scan='due').track_inprogress():
+            now = timezone.now()
+            with scan_reads():
+                due_tasks = list(Task.objects.filter(
+                    due_date__lte=now,
+                    is_completed=False,
+                    notifications_disabled=False  # Исключаем задачи с отключенными уведомлениями
+                ).select_related('user').prefetch_related('categories'))
+
+            SCAN_ROWS_MATCHED.labels(scan='due').set(len(due_tasks))
+            logger.info(f"Found {len(due_tasks)} overdue tasks with notifications enabled")
+
+            for task in due_tasks:
+                success = notify_user_about_due_task(task)
+                # Лаг: сколько прошло от дедлайна до отправки
+                record_notification('due', success, (timezone.now() - task.due_date).total_seconds())
+                if success:
+                    logger.info(f"Successfully notified user about overdue task {task.id}")
+                else:
+                    logger.error(f"Failed to notify user about overdue task {task.id}")
+
+            # Просроченное повторение серии: следующее создаётся сразу, не дожидаясь выполнения
+            # (в том числе для задач с отключёнными уведомлениями). Повторения, у которых
+            # следующее уже есть, отмечены superseded - выборка не растёт с каждым пропуском
+            from .recurrence import materialize_overdue
+            with scan_reads():
+                overdue_recurring = list(Task.objects.filter(
+                    due_date__lte=now,
+                    is_completed=False,
+                    superseded=False,
+                ).exclude(recurrence_freq='').select_related('user'))
+            created = materialize_overdue(overdue_recurring, now)
+            if created:
+                logger.info(f"Materialized {len(created)} next occurrences of recurring tasks")
 
 @shared_task
 def check_upcoming_tasks():
-    """Проверка задач с приближающимся дедлайном (за 1 час)"""
+    """Напоминания о приближающихся дедлайнах по порогам профиля или задачи (за сутки, за час, ...)"""
     from .models import Task
+    from .reminders import crossed_threshold, next_reminder_at
+
+    with single_run('check_upcoming_tasks', settings.SCAN_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            logger.warning("check_upcoming_tasks is still running, skipping this run")
+            SCAN_SKIPPED.labels(scan='upcoming').inc()
+            return
+        with SCAN_IN_PROGRESS.labels(scan='upcoming').track_inprogress():
+            now = timezone.now()
+
+            # Все пороги сразу: один диапазонный запрос по индексу next_reminder_at.
+            # Читаем с основной БД - по отстающей реплике ушло бы повторное напоминание
+            reminder_tasks = list(Task.objects.filter(
+                next_reminder_at__lte=now
+            ).select_related('user').prefetch_related('categories'))
+
+            SCAN_ROWS_MATCHED.labels(scan='upcoming').set(len(reminder_tasks))
+            logger.info(f"Found {len(reminder_tasks)} tasks with reminder thresholds crossed")
+
+            skipped = 0
+            for task in reminder_tasks:
+                read_next_reminder_at, read_due_date = task.next_reminder_at, task.due_date
+                # Выполненные, заглушённые (bulk_mute обходит Task.save) и просроченные
+                # задачи выпадают из расписания без отправки
+                if task.is_completed or task.notifications_disabled or task.due_date <= now:
+                    task.next_reminder_at = None
+                else:
+                    offsets = task.reminder_offsets if task.reminder_offsets is not None else task.user.reminder_offsets
+                    threshold = crossed_threshold(task.due_date, offsets, task.last_reminder_at, now)
+                    if threshold is not None:
+                        success = notify_user_about_upcoming_task(task)
+                        record_notification('upcoming', success, (now - threshold).total_seconds())
+                        if not success:
+                            # Порог не отмечаем - повторим на следующем запуске
+                            logger.error(f"Failed to notify user about upcoming task {task.id}")
+                            continue
+                        logger.info(f"Successfully notified user about upcoming task {task.id}")
+                        task.last_reminder_at = threshold
+                    task.next_reminder_at = next_reminder_at(task.due_date, offsets, task.last_reminder_at)
+
+                # Условная запись: если задачу успели изменить (новый срок, выполнение, другие
+                # пороги), её расписание уже пересчитано в Task.save() - не затираем его
+                updated = Task.objects.filter(
+                    pk=task.pk, next_reminder_at=read_next_reminder_at, due_date=read_due_date,
+                ).update(next_reminder_at=task.next_reminder_at, last_reminder_at=task.last_reminder_at)
+                skipped += not updated
+
+            if skipped:
+                logger.info(f"Skipped {skipped} tasks changed during the reminder scan")
 
-    now = timezone.now()
-    from datetime import timedelta
-
-    # Задачи, дедлайн которых наступит в течение часа
-    upcoming_deadline = now + timedelta(hours=1)
-    upcoming_tasks = Task.objects.filter(
-        due_date__gt=now,
-        due_date__lte=upcoming_deadline,
-        is_completed=False,
-        notifications_disabled=False  # Исключаем задачи с отключенными уведомлениями
-    ).select_related('user').prefetch_related('categories')
-
-    logger.info(f"Found {upcoming_tasks.count()} upcoming tasks with notifications enabled")
-
-    for task in upcoming_tasks:
-        success = notify_user_about_upcoming_task(task)
-        if success:
-            logger.info(f"Successfully notified user about upcoming task {task.id}")
-        else:
-            logger.error(f"Failed to notify user about upcoming task {task.id}")
 
 @shared_task
 def send_daily_reminder():
     """Ежедневное напоминание о задачах"""
-    from .models import Task, UserProfile
+    with single_run('send_daily_reminder', settings.SCAN_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            logger.warning("send_daily_reminder is still running, skipping this run")
+            SCAN_SKIPPED.labels(scan='daily').inc()
+            return
+        with SCAN_IN_PROGRESS.labels(scan='daily').track_inprogress(), scan_reads():
+            _send_daily_reminder()
+
+def _send_daily_reminder():
+    from .models import UserProfile, LOCAL_TZ
     from datetime import timedelta
 
     now = timezone.now()
     tomorrow = now + timedelta(days=1)
 
-    users_with_tasks = UserProfile.objects.filter(
+    users_with_tasks = list(UserProfile.objects.filter(
         tasks__is_completed=False,
         tasks__due_date__gte=now,
         tasks__due_date__lte=tomorrow
-    ).distinct()
+    ).distinct())
 
-    logger.info(f"Sending daily reminders to {users_with_tasks.count()} users")
+    SCAN_ROWS_MATCHED.labels(scan='daily').set(len(users_with_tasks))
+    logger.info(f"Sending daily reminders to {len(users_with_tasks)} users")
 
     for user_profile in users_with_tasks:
         try:
@@ -199,9 +264,8 @@ def send_daily_reminder():
 
 """
                 for task in tomorrow_tasks:
-                    # Конвертируем в локальное время America/Adak
-                    local_tz = pytz.timezone('America/Adak')
-                    due_date_local = task.due_date.astimezone(local_tz)
+                    # Конвертируем в местное время
+                    due_date_local = task.due_date.astimezone(LOCAL_TZ)
                     due_time_str = due_date_local.strftime('%H:%M')
                     message += f"""
 📋 <b>{task.title}</b>
@@ -211,10 +275,12 @@ def send_daily_reminder():
 
                 message += f"\nВсего задач на завтра: <b>{tomorrow_tasks.count()}</b>"
 
-                send_telegram_notification(user_profile.telegram_id, message.strip())
+                success = send_telegram_notification(user_profile.telegram_id, message.strip())
+                record_notification('daily', success)
                 logger.info(f"Sent daily reminder to user {user_profile.telegram_id}")
 
         except Exception as e:
+            record_notification('daily', False)
             logger.error(f"Error sending daily reminder to user {user_profile.telegram_id}: {e}")
 
 @shared_task
@@ -224,6 +290,108 @@ def cleanup_old_notifications():
     # Например, удаление записей о доставленных уведомлениях
     logger.info("Cleanup old notifications task completed")
 
+@shared_task
+def cleanup_task_changes(batch_size=10000):
+    """Удаление старых записей журнала изменений задач"""
+    from .models import TaskChange, TaskChangeWatermark
+    from datetime import timedelta
+    from django.db import transaction
+
+    cutoff = timezone.now() - timedelta(days=settings.TASK_CHANGES_RETENTION_DAYS)
+    deleted_total = 0
+    while True:
+        # Удаляем пачками, чтобы не держать долгую блокировку на большом журнале
+        batch = list(
+            TaskChange.objects.filter(changed_at__lt=cutoff)
+            .order_by('seq').values_list('seq', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        with transaction.atomic():
+            deleted, _ = TaskChange.objects.filter(seq__in=batch).delete()
+            # Граница удалённого сохраняется вместе с удалением - по ней changes отвечает reset
+            TaskChangeWatermark.objects.update_or_create(pk=1, defaults={'purged_seq': batch[-1]})
+        deleted_total += deleted
+
+    logger.info(f"Removed {deleted_total} task change records older than {cutoff}")
+    return deleted_total
+
+@shared_task
+def archive_completed_tasks(batch_size=None):
+    """Перенос выполненных задач старше TASK_ARCHIVE_AFTER_DAYS в ArchivedTask"""
+    from .models import Task, ArchivedTask, UserProfile
+    from .events import record_changes
+    from .signals import mute_task_signals
+    from datetime import timedelta
+    from django.db import transaction
+    from django.db.models import Exists, OuterRef
+
+    batch_size = batch_size or settings.TASK_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=settings.TASK_ARCHIVE_AFTER_DAYS)
+    task_links = Task.categories.through
+    archive_links = ArchivedTask.categories.through
+    archived_total = 0
+
+    with single_run('archive_completed_tasks', settings.SCAN_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            logger.warning("archive_completed_tasks is still running, skipping this run")
+            return 0
+        while True:
+            # Каждая пачка - отдельная транзакция: строки блокируются, пока не перенесены
+            with transaction.atomic():
+                batch = list(
+                    Task.objects.select_for_update()
+                    .filter(is_completed=True, completed_at__lt=cutoff)
+                    # Удаление родителя удалило бы и подзадачи: он уходит в архив после них
+                    .exclude(Exists(Task.objects.filter(parent_id=OuterRef('pk'))))
+                    .order_by('completed_at')[:batch_size]
+                )
+                if not batch:
+                    break
+                ids = [task.id for task in batch]
+                telegram_ids = dict(
+                    UserProfile.objects.filter(id__in={task.user_id for task in batch}).values_list('id', 'telegram_id')
+                )
+                ArchivedTask.objects.bulk_create([
+                    ArchivedTask(
+                        id=task.id,
+                        title=task.title,
+                        description=task.description,
+                        created_at=task.created_at,
+                        updated_at=task.updated_at,
+                        due_date=task.due_date,
+                        user_id=task.user_id,
+                        is_completed=True,
+                        completed_at=task.completed_at,
+                        notifications_disabled=task.notifications_disabled,
+                        recurrence_freq=task.recurrence_freq,
+                        recurrence_interval=task.recurrence_interval,
+                        recurrence_until=task.recurrence_until,
+                        recurrence_count=task.recurrence_count,
+                        series_id=task.series_id,
+                        occurrence_index=task.occurrence_index,
+                        reminder_offsets=task.reminder_offsets,
+                        parent_id=task.parent_id,
+                        depth=task.depth,
+                    )
+                    for task in batch
+                ], ignore_conflicts=True)
+                archive_links.objects.bulk_create([
+                    archive_links(archivedtask_id=task_id, category_id=category_id)
+                    for task_id, category_id in task_links.objects.filter(task_id__in=ids).values_list('task_id', 'category_id')
+                ], ignore_conflicts=True)
+                # Для клиентов синхронизации архивная задача выглядит как удалённая;
+                # одно пакетное событие вместо post_delete на каждую задачу
+                with mute_task_signals():
+                    Task.objects.filter(id__in=ids).delete()
+                record_changes(('task.deleted', task.id, telegram_ids.get(task.user_id)) for task in batch)
+            archived_total += len(batch)
+            if len(batch) < batch_size:
+                break
+
+    logger.info(f"Archived {archived_total} completed tasks older than {cutoff}")
+    return archived_total
+
 @shared_task
 def disable_task_notifications(task_id):
     """Отключение уведомлений для конкретной задачи"""
@@ -0,0 +1,63 @@
+import logging
+import time
+import redis
+from rest_framework.throttling import SimpleRateThrottle
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class RedisRateThrottle(SimpleRateThrottle):
+    """Фиксированное окно: один INCR+EXPIRE в Redis на запрос.
+
+    Клиент - telegram_id из запроса (бот ходит с одного адреса от имени всех
+    пользователей), без него - IP. Лимиты задаются в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    в формате DRF ('120/min'). Без Redis запросы пропускаются.
+    """
+    scope = 'api'
+
+    def get_cache_key(self, request, view):
+        telegram_id = request.query_params.get('telegram_id')
+        if telegram_id is None and isinstance(request.data, dict):
+            telegram_id = request.data.get('telegram_id')
+        ident = f'tg:{telegram_id}' if telegram_id else f'ip:{self.get_ident(request)}'
+        return f'todo:throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        now = time.time()
+        window = int(now // self.duration)
+        # Остаток окна - для Retry-After
+        self.wait_seconds = (window + 1) * self.duration - now
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.incr(f'{key}:{window}')
+            pipe.expire(f'{key}:{window}', self.duration)
+            count, _ = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Throttle {self.scope} unavailable, allowing request: {e}")
+            return True
+        return count <= self.num_requests
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class ScopedRedisRateThrottle(RedisRateThrottle):
+    """Отдельный бюджет для дорогих действий: scope берётся из view.throttle_scopes[view.action]"""
+
+    def __init__(self):
+        # Scope известен только вместе с view - rate выбирается в allow_request
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if self.scope is None:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import TaskViewSet, CategoryViewSet, UserProfileViewSet
+from .views import TaskViewSet, CategoryViewSet, UserProfileViewSet, HealthView
 
 router = DefaultRouter()
 router.register(r'tasks', TaskViewSet, basename='task')
@@ -8,5 +8,6 @@ router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'profiles', UserProfileViewSet, basename='profile')
 
 urlpatterns = [
+    path('health/', HealthView.as_view(), name='health'),
     path('', include(router.urls)),
 ]
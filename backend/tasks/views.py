@@ -2,38 +2,304 @@ from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.renderers import JSONRenderer
+from .renderers import NDJSONRenderer, CSVRenderer, Echo, ndjson_line
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.filters import SearchFilter, OrderingFilter
+import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Task, Category, UserProfile
+from .models import Task, Category, UserProfile, TaskChange, TaskChangeWatermark, ArchivedTask, LOCAL_TZ
 from .serializers import TaskSerializer, CategorySerializer, UserProfileSerializer
-from django.contrib.auth.models import User
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
 from django.utils import timezone
+from .redis_client import get_redis
+from .events import record_changes
+from .importer import TaskImporter, detect_format, FORMATS
+from .profiles import get_or_create_telegram_profile
+from .cache import task_list_cache_key, set_cached_task_list, record_lookup, get_validator_state, get_category_names
+from .search import TaskSearch, SearchError
+from .agenda import PeriodError, calendar_days, parse_period
+from .subtasks import complete_subtree, descendants_of, rollup
+from .conditional import make_etag, latest_timestamp, not_modified, set_validators
+from todo_backend.db_router import use_replica, read_alias
+from datetime import timedelta
+import csv
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_FIELDS = [
+    'id', 'title', 'description', 'due_date', 'created_at', 'telegram_id',
+    'categories', 'is_completed', 'notifications_disabled',
+]
+
+
+def task_export_row(task, telegram_id):
+    """Строка экспорта; due_date в том же формате, что принимает import_tasks"""
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'due_date': task.due_date.astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M'),
+        'created_at': task.created_at.isoformat(),
+        'telegram_id': telegram_id,
+        'categories': [category.name for category in task.categories.all()],
+        'is_completed': task.is_completed,
+        'notifications_disabled': task.notifications_disabled,
+    }
+
+
+def replica_safe(changed_at):
+    """Реплику можно читать, если данные не менялись последние REPLICA_READ_AFTER_WRITE_SECONDS"""
+    return changed_at is None or time.time() - changed_at >= settings.REPLICA_READ_AFTER_WRITE_SECONDS
+
+
+def state_replica_safe(state, key):
+    # Без Redis (state is None) неизвестно, когда менялись данные, - читаем с основной БД
+    return state is not None and replica_safe(state[key])
+
+
+class HealthView(APIView):
+    """Лёгкая проверка доступности БД и Redis"""
+    authentication_classes = []
+    throttle_classes = []
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        checks = {
+            'db': self._check_db(),
+            'redis': self._check_redis(),
+        }
+        healthy = all(checks.values())
+        return Response(
+            {'status': 'ok' if healthy else 'error', **checks},
+            status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    def _check_db(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception as e:
+            logger.error(f"Health check: database unavailable: {e}")
+            return False
+
+    def _check_redis(self):
+        try:
+            return bool(get_redis().ping())
+        except Exception as e:
+            logger.error(f"Health check: redis unavailable: {e}")
+            return False
+
+
+class ArchivedTaskFilterSet(django_filters.FilterSet):
+    # Те же фильтры, что и у задач; родитель у архивной задачи - простой parent_id
+    parent = django_filters.CharFilter(field_name='parent_id')
+
+    class Meta:
+        model = ArchivedTask
+        fields = ['is_completed', 'user', 'categories', 'series_id', 'recurrence_freq', 'depth']
+
+
+class TaskFilterBackend(DjangoFilterBackend):
+    """filterset_fields задач; для ArchivedTask (?include_archived=1) - ArchivedTaskFilterSet"""
+
+    def get_filterset_class(self, view, queryset=None):
+        if queryset is not None and queryset.model is ArchivedTask:
+            return ArchivedTaskFilterSet
+        return super().get_filterset_class(view, queryset)
 
 
 class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['is_completed', 'user', 'categories']
+    filter_backends = [TaskFilterBackend, SearchFilter, OrderingFilter]
+    filterset_fields = ['is_completed', 'user', 'categories', 'series_id', 'recurrence_freq', 'parent', 'depth']
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'due_date', 'title']
     ordering = ['-created_at']
+    BULK_MUTE_MAX_IDS = 500
+    SEARCH_MAX_PAGE_SIZE = 200
+    CALENDAR_MAX_PER_DAY = 20
+    # Отдельные бюджеты запросов (REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']) для дорогих действий
+    throttle_scopes = {
+        'list': 'list',
+        'subtree': 'list',
+        'calendar': 'list',
+        'search': 'search',
+        'export': 'export',
+    }
 
     def get_queryset(self):
         telegram_id = self.request.query_params.get('telegram_id')
         if telegram_id:
-            return Task.objects.filter(user__telegram_id=telegram_id)
-        return Task.objects.all()
+            return self.optimize_queryset(Task.objects.filter(user__telegram_id=telegram_id))
+        return self.optimize_queryset(Task.objects.all())
+
+    def optimize_queryset(self, queryset):
+        """JOIN и prefetch только для полей, которые попадут в ответ (?fields= / ?omit=)"""
+        fields = TaskSerializer.sparse_field_names(self.request)
+        if 'user_info' in fields:
+            queryset = queryset.select_related('user')
+        if 'categories' in fields or 'category_names' in fields:
+            queryset = queryset.prefetch_related('categories')
+        return queryset
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived') in ('1', 'true')
+
+    def get_archived_queryset(self):
+        telegram_id = self.request.query_params.get('telegram_id')
+        if telegram_id:
+            return self.optimize_queryset(ArchivedTask.objects.filter(user__telegram_id=telegram_id))
+        return self.optimize_queryset(ArchivedTask.objects.all())
+
+    def get_task_list(self):
+        """Задачи списка; с ?include_archived=1 к ним добавляются архивные с теми же фильтрами и сортировкой"""
+        tasks = list(self.filter_queryset(self.get_queryset()))
+        if not self.include_archived():
+            return tasks
+        # Фильтры и сортировка DRF применяются к ArchivedTask так же, как к Task
+        archived = list(self.filter_queryset(self.get_archived_queryset()))
+        ordering = OrderingFilter().get_ordering(self.request, self.get_queryset(), self) or []
+        result = tasks + archived
+        for field in reversed(ordering):
+            result.sort(key=lambda task: getattr(task, field.lstrip('-')), reverse=field.startswith('-'))
+        return result
+
+    def list(self, request, *args, **kwargs):
+        telegram_id = request.query_params.get('telegram_id')
+        # Версионный кэш списка пользователя читается тем же MGET, что и версии
+        list_key = None
+        if telegram_id and self.paginator is None:
+            list_key = task_list_cache_key(telegram_id, request.query_params, request.accepted_media_type)
+        state = get_validator_state(telegram_id, list_key)
+        cached = state['cached_list'] if state is not None and list_key is not None else None
+        if cached is not None:
+            # Попадание: ни одного запроса к БД, валидаторы сохранены вместе со списком
+            record_lookup(hit=True)
+            response = not_modified(request, cached['etag'], cached['last_modified'])
+            if response is not None:
+                return response
+            return set_validators(Response(cached['data']), cached['etag'], cached['last_modified'])
+        # Только что изменённые данные читаем с основной БД - реплика может их ещё не получить
+        with use_replica(state_replica_safe(state, 'user_changed_at' if telegram_id else 'changed_at')):
+            return self._list(request, telegram_id, state, list_key, *args, **kwargs)
+
+    def _list(self, request, telegram_id, state, list_key, *args, **kwargs):
+        etag = last_modified = None
+        if state is not None:
+            etag, last_modified = self.get_list_validators(telegram_id, state)
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+        if list_key is None or state is None:
+            if self.include_archived():
+                response = Response(self.get_serializer(self.get_task_list(), many=True).data)
+            else:
+                response = super().list(request, *args, **kwargs)
+            return set_validators(response, etag, last_modified)
+        # Версия пользователя меняется при любом изменении его задач - запись устаревает вместе с ней
+        record_lookup(hit=False)
+        tasks = self.get_task_list()
+        data = self.get_serializer(tasks, many=True).data
+        set_cached_task_list(list_key, state, data, tasks, etag, last_modified)
+        return set_validators(Response(data), etag, last_modified)
+
+    def get_list_validators(self, telegram_id, state):
+        """ETag и Last-Modified списка одним агрегатным запросом, без сериализации"""
+        now = timezone.now()
+        overdue = Q(is_completed=False, due_date__lt=now)
+        stats = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            count=Count('id'),
+            updated_at=Max('updated_at'),
+            overdue=Count('id', filter=overdue),
+            overdue_since=Max('due_date', filter=overdue),
+        )
+        if self.include_archived():
+            stats['archived'] = self.filter_queryset(self.get_archived_queryset()).order_by().aggregate(
+                count=Count('id'),
+                archived_at=Max('archived_at'),
+            )
+        params = sorted(self.request.query_params.lists())
+        # Список пользователя зависит только от его версии и версии категорий -
+        # записи других пользователей не должны менять его ETag
+        if telegram_id:
+            versions = (state['user_version'], state['categories_version'])
+        else:
+            versions = (state['tasks_version'], state['categories_version'])
+        etag = make_etag(params, stats, versions, self.request.accepted_media_type)
+        last_modified = None
+        # Удаления не видны в updated_at - Last-Modified только там, где известно время изменения
+        if telegram_id:
+            last_modified = latest_timestamp(
+                stats['updated_at'], stats['overdue_since'],
+                state['user_changed_at'], state['categories_changed_at'],
+            )
+        return etag, last_modified
+
+    def retrieve(self, request, *args, **kwargs):
+        task = self.get_object()
+        state = get_validator_state(task.user.telegram_id)
+        if state is None:
+            return Response(self.get_serializer(task).data)
+        is_overdue = not task.is_completed and task.due_date < timezone.now()
+        etag = make_etag(
+            task.id, task.updated_at, is_overdue, state['categories_version'], state['user_version'],
+            request.accepted_media_type,
+        )
+        last_modified = latest_timestamp(
+            task.updated_at, task.due_date if is_overdue else None,
+            state['user_changed_at'], state['categories_changed_at'],
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(task)
+        return set_validators(Response(serializer.data), etag, last_modified)
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
-        """Отметить задачу как выполненную"""
+        """Отметить задачу как выполненную; с cascade=true - вместе со всеми подзадачами"""
         task = self.get_object()
-        task.is_completed = True
-        task.save()
+        if str(request.data.get('cascade', request.query_params.get('cascade', ''))).lower() in ('1', 'true'):
+            complete_subtree(task)
+        else:
+            task.is_completed = True
+            task.save()
         serializer = self.get_serializer(task)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def subtree(self, request, pk=None):
+        """Задача со всеми подзадачами в виде дерева (children), прогресс - по этим же строкам"""
+        task = self.get_object()
+        state = get_validator_state(task.user.telegram_id)
+        with use_replica(state_replica_safe(state, 'user_changed_at')):
+            # Все уровни - один запрос по префиксу path, без запроса на каждый узел
+            nodes = [task] + list(self.optimize_queryset(descendants_of(task)).order_by('depth', 'due_date', 'id'))
+            serializer = self.get_serializer(nodes, many=True)
+            serializer.context['subtask_progress'] = rollup(
+                ((node.path, node.is_completed) for node in nodes[1:]), {node.id for node in nodes}
+            )
+            data = serializer.data
+        items = {}
+        for node, item in zip(nodes, data):
+            item['children'] = []
+            items[node.id] = item
+            if node is not task:
+                items[node.parent_id]['children'].append(item)
+        return Response(items[task.id])
+
     @action(detail=True, methods=['post'])
     def uncomplete(self, request, pk=None):
         """Отметить задачу как невыполненную"""
@@ -43,20 +309,265 @@ class TaskViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(task)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def quick_add(self, request):
+        """Создать задачу одним запросом (профиль создаётся при необходимости)"""
+        telegram_id = request.data.get('telegram_id')
+        if not telegram_id:
+            return Response({'error': 'telegram_id required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        category_ids = []
+        for name in request.data.get('category_names', []):
+            category = Category.objects.filter(name__iexact=name).first()
+            if not category:
+                return Response({'error': f'Unknown category: {name}'}, status=status.HTTP_400_BAD_REQUEST)
+            category_ids.append(category.id)
+
+        # Невалидная задача откатывает и только что созданный профиль
+        with transaction.atomic():
+            profile, _ = get_or_create_telegram_profile(
+                telegram_id,
+                request.data.get('telegram_username', f'tg_{telegram_id}'),
+                request.data.get('first_name', ''),
+                request.data.get('last_name', ''),
+            )
+            serializer = self.get_serializer(data={
+                'title': request.data.get('title'),
+                'description': request.data.get('description', ''),
+                'due_date': request.data.get('due_date'),
+                'user': profile.id,
+                'categories': category_ids,
+                **{
+                    field: request.data[field]
+                    for field in TaskSerializer.RECURRENCE_FIELDS + ('parent',)
+                    if request.data.get(field) is not None
+                },
+            })
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def bulk_mute(self, request):
+        """Отключить уведомления сразу для нескольких задач"""
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.BULK_MUTE_MAX_IDS:
+            return Response(
+                {'error': f'Too many ids (max {self.BULK_MUTE_MAX_IDS})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = [str(task_id) for task_id in ids]
+        found = dict(Task.objects.filter(id__in=ids).values_list('id', 'user__telegram_id'))
+        with transaction.atomic():
+            Task.objects.filter(id__in=found, notifications_disabled=False).update(
+                notifications_disabled=True,
+                updated_at=timezone.now(),
+            )
+            # update() не вызывает post_save - публикуем события сами
+            record_changes(('task.updated', task_id, telegram_id) for task_id, telegram_id in found.items())
+        return Response({
+            'muted': [task_id for task_id in ids if task_id in found],
+            'missing': [task_id for task_id in ids if task_id not in found],
+        })
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def import_tasks(self, request):
+        """Импорт задач из CSV/NDJSON-файла (поле file), ошибки возвращаются по строкам"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file required'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('file_format') or detect_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({'error': f'Unknown file_format: {fmt}'}, status=status.HTTP_400_BAD_REQUEST)
+        importer = TaskImporter(create_categories=request.data.get('create_categories') in ('1', 'true'))
+        report = importer.run(upload, fmt)
+        logger.info(
+            f"Imported {report['imported']} of {report['rows']} tasks from {upload.name} "
+            f"in {report['duration_s']} s, {report['failed']} failed"
+        )
+        return Response(report)
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """Потоковая выгрузка задач пользователя в NDJSON или CSV (?format=ndjson|csv)"""
+        telegram_id = request.query_params.get('telegram_id')
+        if not telegram_id:
+            return Response({'error': 'telegram_id required'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.accepted_renderer.format
+        # Строки читаются уже после выхода из view, поэтому БД выбирается явно через using()
+        with use_replica(state_replica_safe(get_validator_state(telegram_id), 'user_changed_at')):
+            alias = read_alias()
+        queryset = (
+            self.filter_queryset(self.get_queryset()).using(alias)
+            .select_related(None)
+            .only('id', 'title', 'description', 'due_date', 'created_at', 'is_completed', 'notifications_disabled')
+            .prefetch_related('categories')
+        )
+        # iterator() читает БД курсором на сервере, prefetch выполняется на каждую пачку
+        tasks = queryset.iterator(chunk_size=settings.TASK_EXPORT_CHUNK_SIZE)
+        if self.include_archived():
+            archived = (
+                self.filter_queryset(self.get_archived_queryset()).using(alias)
+                .select_related(None)
+                .only('id', 'title', 'description', 'due_date', 'created_at', 'is_completed', 'notifications_disabled')
+                .prefetch_related('categories')
+            )
+            tasks = itertools.chain(tasks, archived.iterator(chunk_size=settings.TASK_EXPORT_CHUNK_SIZE))
+        if fmt == 'csv':
+            rows = self._export_csv(tasks, telegram_id)
+        else:
+            rows = (ndjson_line(task_export_row(task, telegram_id)) for task in tasks)
+        response = StreamingHttpResponse(rows, content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="tasks-{telegram_id}.{fmt}"'
+        return response
+
+    def _export_csv(self, tasks, telegram_id):
+        writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS)
+        # Заголовок отдаём сразу, до первого запроса к БД
+        yield writer.writeheader()
+        for task in tasks:
+            row = task_export_row(task, telegram_id)
+            row['categories'] = ';'.join(row['categories'])
+            yield writer.writerow(row)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Изменения задач пользователя после курсора since; удалённые задачи - в deleted"""
+        telegram_id = request.query_params.get('telegram_id')
+        if not telegram_id:
+            return Response({'error': 'telegram_id required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', settings.TASK_CHANGES_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.TASK_CHANGES_PAGE_SIZE))
+
+        purged = TaskChangeWatermark.purged()
+        cursor = max(TaskChange.objects.aggregate(last=Max('seq'))['last'] or 0, purged)
+        # Записи после курсора удалены по retention - клиент должен пересобрать копию
+        reset = since > 0 and since < purged
+        tasks = Task.objects.filter(user__telegram_id=telegram_id).select_related('user').prefetch_related('categories')
+        if since <= 0 or reset:
+            return Response({
+                'cursor': cursor,
+                'reset': True,
+                'has_more': False,
+                'tasks': self.get_serializer(tasks, many=True).data,
+                'deleted': [],
+            })
+
+        # Журнал пишется в транзакции изменения: запись с меньшим seq может закоммититься
+        # позже большей - свежие записи отдаём, когда такие транзакции уже завершились
+        settled = timezone.now() - timedelta(seconds=settings.TASK_CHANGES_SETTLE_SECONDS)
+        changes = list(
+            TaskChange.objects.filter(telegram_id=telegram_id, seq__gt=since, changed_at__lte=settled)
+            .order_by('seq').values_list('seq', 'task_id')[:limit + 1]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        task_ids = {task_id for _, task_id in changes}
+        live = list(tasks.filter(id__in=task_ids))
+        live_ids = {task.id for task in live}
+        return Response({
+            'cursor': changes[-1][0] if changes else since,
+            'reset': False,
+            'has_more': has_more,
+            'tasks': self.get_serializer(live, many=True).data,
+            'deleted': sorted(task_ids - live_ids),
+        })
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Фасетный поиск: страница задач и счётчики по категориям и состояниям"""
+        telegram_id = request.query_params.get('telegram_id')
+        try:
+            search = TaskSearch(request.query_params, timezone.now())
+            page = int(request.query_params.get('page', 1))
+            page_size = int(request.query_params.get('page_size', settings.TASK_SEARCH_PAGE_SIZE))
+        except SearchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        page = max(page, 1)
+        page_size = max(1, min(page_size, self.SEARCH_MAX_PAGE_SIZE))
+
+        state = get_validator_state(telegram_id)
+        category_names = get_category_names()
+        with use_replica(state_replica_safe(state, 'user_changed_at' if telegram_id else 'changed_at')):
+            queryset = SearchFilter().filter_queryset(request, self.get_queryset(), self)
+            # Фасеты - один агрегатный запрос, страница - ещё один (плюс prefetch категорий)
+            total, facets = search.facets(queryset, list(category_names))
+            results = OrderingFilter().filter_queryset(request, search.results(queryset), self)
+            offset = (page - 1) * page_size
+            data = self.get_serializer(results[offset:offset + page_size], many=True).data
+
+        facets['categories'] = sorted(
+            (
+                {'id': category_id, 'name': category_names[category_id], 'count': count}
+                for category_id, count in facets['categories'].items()
+            ),
+            key=lambda item: (-item['count'], item['name']),
+        )
+        return Response({
+            'count': total,
+            'page': page,
+            'page_size': page_size,
+            'results': data,
+            'facets': facets,
+        })
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """Календарь на месяц (?month=YYYY-MM) или неделю (?week=YYYY-Www): счётчики и первые задачи по дням"""
+        telegram_id = request.query_params.get('telegram_id')
+        if not telegram_id:
+            return Response({'error': 'telegram_id required'}, status=status.HTTP_400_BAD_REQUEST)
+        profile = UserProfile.objects.filter(telegram_id=telegram_id).only('id').first()
+        if profile is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        tz = LOCAL_TZ
+        now = timezone.now()
+        try:
+            start, end, period = parse_period(
+                request.query_params.get('month'),
+                request.query_params.get('week'),
+                today=now.astimezone(tz).date(),
+            )
+            per_day = int(request.query_params.get('per_day', settings.TASK_CALENDAR_PER_DAY))
+        except PeriodError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'error': 'per_day must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        per_day = max(1, min(per_day, self.CALENDAR_MAX_PER_DAY))
+
+        state = get_validator_state(telegram_id)
+        with use_replica(state_replica_safe(state, 'user_changed_at')):
+            days = calendar_days(profile.id, tz, start, end, now, per_day)
+        return Response({**period, 'timezone': tz.zone, 'days': days})
+
     @action(detail=False, methods=['get'])
     def overdue(self, request):
         """Получить просроченные задачи"""
-        overdue_tasks = Task.objects.filter(
+        overdue_tasks = self.optimize_queryset(Task.objects.filter(
             due_date__lt=timezone.now(),
             is_completed=False
-        )
+        ))
         serializer = self.get_serializer(overdue_tasks, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def completed(self, request):
         """Получить выполненные задачи"""
-        completed_tasks = Task.objects.filter(is_completed=True)
+        completed_tasks = self.optimize_queryset(Task.objects.filter(is_completed=True))
         serializer = self.get_serializer(completed_tasks, many=True)
         return Response(serializer.data)
 
@@ -69,6 +580,30 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name']
     ordering = ['name']
 
+    def get_validators(self, *parts):
+        """task_count зависит от задач, поэтому в ETag входят версии категорий и задач"""
+        state = get_validator_state()
+        if state is None:
+            return None, None
+        etag = make_etag(parts, state['categories_version'], state['tasks_version'], self.request.accepted_media_type)
+        return etag, state['changed_at']
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(sorted(request.query_params.lists()))
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        with use_replica(etag is not None and replica_safe(last_modified)):
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(kwargs.get('pk'))
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        return set_validators(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
     @action(detail=True, methods=['get'])
     def tasks(self, request, pk=None):
         """Получить все задачи в категории"""
@@ -95,6 +630,13 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     search_fields = ['telegram_username', 'user__first_name', 'user__last_name']
     ordering_fields = ['telegram_username', 'user__first_name']
     ordering = ['telegram_username']
+    throttle_scopes = {'stats': 'stats'}
+
+    def get_queryset(self):
+        queryset = UserProfile.objects.all()
+        if 'user' in UserProfileSerializer.sparse_field_names(self.request):
+            queryset = queryset.select_related('user')
+        return queryset
 
     def create(self, request, *args, **kwargs):
         telegram_id = request.data.get('telegram_id')
@@ -103,28 +645,9 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         last_name = request.data.get('last_name', '')
         if not telegram_id:
             return Response({'error': 'telegram_id required'}, status=status.HTTP_400_BAD_REQUEST)
-        # Проверяем, есть ли уже профиль
-        profile = UserProfile.objects.filter(telegram_id=telegram_id).first()
-        if profile:
-            serializer = self.get_serializer(profile)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        # Создаём User
-        user, _ = User.objects.get_or_create(
-            username=f'tg_{telegram_id}',
-            defaults={
-                'email': f'{telegram_id}@tg.local',
-                'first_name': first_name,
-                'last_name': last_name,
-            }
-        )
-        # Создаём профиль
-        profile = UserProfile.objects.create(
-            user=user,
-            telegram_id=telegram_id,
-            telegram_username=telegram_username
-        )
+        profile, created = get_or_create_telegram_profile(telegram_id, telegram_username, first_name, last_name)
         serializer = self.get_serializer(profile)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
     @action(detail=True, methods=['get'])
     def tasks(self, request, pk=None):
@@ -138,16 +661,33 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     def stats(self, request, pk=None):
         """Получить статистику пользователя"""
         profile = self.get_object()
-        total_tasks = profile.tasks.count()
-        completed_tasks = profile.tasks.filter(is_completed=True).count()
-        overdue_tasks = profile.tasks.filter(
-            due_date__lt=timezone.now(),
-            is_completed=False
-        ).count()
+        state = get_validator_state(profile.telegram_id) if profile.telegram_id is not None else None
+        overdue = Q(due_date__lt=timezone.now(), is_completed=False)
+        with use_replica(state is not None and replica_safe(state['user_changed_at'])):
+            counts = profile.tasks.order_by().aggregate(
+                total_tasks=Count('id'),
+                completed_tasks=Count('id', filter=Q(is_completed=True)),
+                overdue_tasks=Count('id', filter=overdue),
+                overdue_since=Max('due_date', filter=overdue),
+            )
+            # Архивные задачи - выполненные, статистика считается за всё время
+            archived_tasks = profile.archived_tasks.count()
+        total_tasks = counts['total_tasks'] + archived_tasks
+        completed_tasks = counts['completed_tasks'] + archived_tasks
+        overdue_tasks = counts['overdue_tasks']
 
-        return Response({
+        # ETag считается по самим счётчикам - тело ответа не сериализуется ради сравнения
+        etag = make_etag(total_tasks, completed_tasks, overdue_tasks, request.accepted_media_type)
+        last_modified = None
+        if state is not None:
+            last_modified = latest_timestamp(state['user_changed_at'], counts['overdue_since'])
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        return set_validators(Response({
             'total_tasks': total_tasks,
             'completed_tasks': completed_tasks,
             'overdue_tasks': overdue_tasks,
             'completion_rate': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-        })
+        }), etag, last_modified)
@@ -19,9 +19,10 @@ app.conf.beat_schedule = {
         'task': 'tasks.tasks.check_due_tasks',
         'schedule': 60.0,
     },
-    'check-upcoming-tasks-every-5-minutes': {
+    # Раз в минуту: пороги напоминаний бывают и за 10 минут до дедлайна
+    'check-upcoming-tasks-every-minute': {
         'task': 'tasks.tasks.check_upcoming_tasks',
-        'schedule': 300.0,
+        'schedule': 60.0,
     },
     'send-daily-reminder-at-9am': {
         'task': 'tasks.tasks.send_daily_reminder',
@@ -31,6 +32,14 @@ app.conf.beat_schedule = {
         'task': 'tasks.tasks.cleanup_old_notifications',
         'schedule': crontab(hour=2, minute=0),
     },
+    'cleanup-task-changes-daily': {
+        'task': 'tasks.tasks.cleanup_task_changes',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'archive-completed-tasks-daily': {
+        'task': 'tasks.tasks.archive_completed_tasks',
+        'schedule': crontab(hour=3, minute=0),
+    },
 }
 
 @app.task(bind=True, ignore_result=True)
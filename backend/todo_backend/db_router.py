@@ -0,0 +1,111 @@
+import contextlib
+import contextvars
+import logging
+from celery.signals import task_prerun
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('tasks.db')
+
+# Чтение с реплики включается явно (use_replica) только для безопасных чтений;
+# после первой записи в запросе/задаче все чтения закрепляются за основной БД
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_pinned_to_primary = contextvars.ContextVar('pinned_to_primary', default=False)
+
+
+def replica_configured():
+    return settings.REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def read_alias():
+    """Алиас БД для чтений в текущем контексте"""
+    if _use_replica.get() and not _pinned_to_primary.get() and replica_configured():
+        return settings.REPLICA_DB_ALIAS
+    return 'default'
+
+
+def reset_routing():
+    _use_replica.set(False)
+    _pinned_to_primary.set(False)
+
+
+@contextlib.contextmanager
+def use_replica(enabled=True):
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_lag_seconds():
+    """Отставание реплики (Postgres standby); 0, если реплика не в режиме восстановления"""
+    connection = connections[settings.REPLICA_DB_ALIAS]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END'
+        )
+        lag = cursor.fetchone()[0]
+    # NULL - реплика ещё не применила ни одной транзакции
+    return float(lag) if lag is not None else float('inf')
+
+
+@contextlib.contextmanager
+def scan_reads(max_lag=None):
+    """Чтения сканирования идут на реплику, если её отставание не больше max_lag секунд.
+
+    При большем отставании или недоступной реплике сканирование читает основную БД:
+    уведомление по устаревшим данным хуже лишней нагрузки на primary.
+    """
+    if not replica_configured():
+        yield 'default'
+        return
+    max_lag = settings.REPLICA_MAX_LAG_SECONDS if max_lag is None else max_lag
+    try:
+        lag = replica_lag_seconds()
+    except Exception as e:
+        logger.error(f"Replica lag check failed, scanning primary: {e}")
+        lag = None
+    if lag is None or lag > max_lag:
+        if lag is not None:
+            logger.warning(f"Replica lag {lag:.1f}s exceeds {max_lag}s, scanning primary")
+        yield 'default'
+        return
+    with use_replica():
+        yield settings.REPLICA_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Записи - в default, чтения - на реплику только внутри use_replica() и до первой записи"""
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        _pinned_to_primary.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """Сбрасывает маршрутизацию в начале каждого запроса (contextvars живут в потоке воркера)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_routing()
+        return self.get_response(request)
+
+
+@task_prerun.connect
+def reset_task_routing(**kwargs):
+    reset_routing()
@@ -28,13 +28,16 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-6_^*w5z8se60gcx_)9y14nh%739d$a@23347=yl&s&0tw!%neo')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DJANGO_DEBUG', 'False') == 'True'
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'backend', '0.0.0.0']
 
 # Telegram Bot Token from environment variable
 BOT_TOKEN = os.getenv('BOT_TOKEN', 'your_token')
 
+# Базовый URL Bot API (для нагрузочных тестов можно указать локальный фейковый сервер)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
 
 # Application definition
 
@@ -52,10 +55,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tasks.middleware.ConcurrencyLimitMiddleware',
+    'tasks.middleware.CompressionMiddleware',
+    'todo_backend.db_router.ReplicaRoutingMiddleware',
+    'tasks.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tasks.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +87,33 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'todo_backend.wsgi.application'
 
+# Инструментация SQL (tasks.middleware.QueryInstrumentationMiddleware):
+# запросы дольше SLOW_REQUEST_MS или с формой запроса, повторённой
+# QUERY_DUPLICATE_THRESHOLD и более раз (N+1), пишутся в лог
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '500'))
+QUERY_DUPLICATE_THRESHOLD = int(os.getenv('QUERY_DUPLICATE_THRESHOLD', '10'))
+
+# Профилирование по запросу (tasks.middleware.ProfilingMiddleware): staff-пользователь
+# добавляет X-Profile: 1 или ?profile=1, а Celery-задачи профилируются с долей
+# CELERY_PROFILE_SAMPLE_RATE (0 - выключено). Файлы .prof пишутся в PROFILE_DIR
+# и доступны для скачивания в админке
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+CELERY_PROFILE_SAMPLE_RATE = float(os.getenv('CELERY_PROFILE_SAMPLE_RATE', '0'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s level=%(levelname)s logger=%(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'tasks': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -94,6 +129,23 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения (todo_backend.db_router): списки, статистика, экспорт и сканирования
+# Celery читают с неё, записи и чтения после записи - с основной БД. Для локальной
+# проверки достаточно указать DB_REPLICA_HOST=db: второй алиас на ту же базу
+REPLICA_DB_ALIAS = 'replica'
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES[REPLICA_DB_ALIAS] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['todo_backend.db_router.ReplicaRouter']
+# Сканирования уходят на основную БД, если реплика отстаёт сильнее
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '30'))
+# Сколько секунд после изменения данных пользователя его чтения идут в основную БД
+REPLICA_READ_AFTER_WRITE_SECONDS = int(os.getenv('REPLICA_READ_AFTER_WRITE_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,9 +192,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django REST Framework settings
 REST_FRAMEWORK = {
+    # MessagePack - для бота (Accept: application/msgpack), JSON остаётся форматом по умолчанию
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
+        'tasks.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'tasks.renderers.MessagePackParser',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -153,7 +213,72 @@ REST_FRAMEWORK = {
     ],
     'SEARCH_PARAM': 'search',
     'ORDERING_PARAM': 'ordering',
+    # Лимиты на клиента (telegram_id, без него - IP), счётчики в Redis (tasks.throttling).
+    # api - все запросы, остальные - отдельные бюджеты дорогих действий поверх него
+    'DEFAULT_THROTTLE_CLASSES': [
+        'tasks.throttling.RedisRateThrottle',
+        'tasks.throttling.ScopedRedisRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'api': os.getenv('THROTTLE_RATE_API', '300/min'),
+        'list': os.getenv('THROTTLE_RATE_LIST', '60/min'),
+        'stats': os.getenv('THROTTLE_RATE_STATS', '30/min'),
+        'export': os.getenv('THROTTLE_RATE_EXPORT', '10/hour'),
+        'search': os.getenv('THROTTLE_RATE_SEARCH', '60/min'),
+    },
+}
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', REDIS_URL),
+        'KEY_PREFIX': 'todo',
+    }
 }
 
-CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
-CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+# Сброс нагрузки (tasks.middleware.ConcurrencyLimitMiddleware): лимит одновременных запросов
+# процесса растёт, пока запросы быстрее CONCURRENCY_TARGET_MS, и падает при медленных;
+# сверх лимита - 429 с Retry-After. CONCURRENCY_TARGET_MS=0 - выключено
+CONCURRENCY_TARGET_MS = int(os.getenv('CONCURRENCY_TARGET_MS', '1000'))
+CONCURRENCY_LIMIT_INITIAL = int(os.getenv('CONCURRENCY_LIMIT_INITIAL', '16'))
+CONCURRENCY_LIMIT_MIN = int(os.getenv('CONCURRENCY_LIMIT_MIN', '2'))
+CONCURRENCY_LIMIT_MAX = int(os.getenv('CONCURRENCY_LIMIT_MAX', '64'))
+CONCURRENCY_RETRY_AFTER = int(os.getenv('CONCURRENCY_RETRY_AFTER', '1'))
+CONCURRENCY_EXEMPT_PATHS = ['/api/health/', '/admin/']
+
+# Время жизни закэшированного ответа GET /api/tasks/?telegram_id=... (секунды)
+TASK_LIST_CACHE_TTL = int(os.getenv('TASK_LIST_CACHE_TTL', '3600'))
+
+# Журнал изменений задач для GET /api/tasks/changes/
+TASK_CHANGES_RETENTION_DAYS = int(os.getenv('TASK_CHANGES_RETENTION_DAYS', '30'))
+TASK_CHANGES_PAGE_SIZE = int(os.getenv('TASK_CHANGES_PAGE_SIZE', '1000'))
+TASK_CHANGES_SETTLE_SECONDS = int(os.getenv('TASK_CHANGES_SETTLE_SECONDS', '5'))
+
+# Архивация: выполненные задачи старше TASK_ARCHIVE_AFTER_DAYS переносятся в ArchivedTask
+TASK_ARCHIVE_AFTER_DAYS = int(os.getenv('TASK_ARCHIVE_AFTER_DAYS', '90'))
+TASK_ARCHIVE_BATCH_SIZE = int(os.getenv('TASK_ARCHIVE_BATCH_SIZE', '1000'))
+
+# Размер пачки строк при потоковой выгрузке GET /api/tasks/export/
+TASK_EXPORT_CHUNK_SIZE = int(os.getenv('TASK_EXPORT_CHUNK_SIZE', '2000'))
+
+# Канал Redis pub/sub с событиями об изменениях задач, категорий и профилей
+CHANGE_EVENTS_CHANNEL = os.getenv('CHANGE_EVENTS_CHANNEL', 'todo:changes')
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+
+# Порт Prometheus-метрик Celery-воркера (0 — не запускать HTTP-сервер)
+CELERY_METRICS_PORT = int(os.getenv('CELERY_METRICS_PORT', '9200'))
+# Максимальное время жизни блокировки от параллельного запуска сканирований
+SCAN_LOCK_TIMEOUT = int(os.getenv('SCAN_LOCK_TIMEOUT', '300'))
+
+# Пороги напоминаний о дедлайне (минуты, через запятую) для новых профилей; 60 - прежнее напоминание за час
+DEFAULT_REMINDER_OFFSETS = [int(value) for value in os.getenv('DEFAULT_REMINDER_OFFSETS', '60').split(',') if value.strip()]
+
+# Размер страницы GET /api/tasks/search/ по умолчанию (максимум - 200)
+TASK_SEARCH_PAGE_SIZE = int(os.getenv('TASK_SEARCH_PAGE_SIZE', '50'))
+
+# Сколько первых задач дня отдаёт GET /api/tasks/calendar/ (?per_day=, максимум 20)
+TASK_CALENDAR_PER_DAY = int(os.getenv('TASK_CALENDAR_PER_DAY', '3'))
@@ -0,0 +1,100 @@
+import json
+import time
+import asyncio
+import logging
+import redis.asyncio as aioredis
+from metrics import CACHE_REQUESTS, CACHE_INVALIDATIONS
+
+logger = logging.getLogger("bot.cache")
+
+
+class TTLCache:
+    """Простой кэш в памяти процесса с временем жизни записей.
+
+    Пока нет подписки на события backend (enabled=False), кэш не используется,
+    чтобы не отдавать устаревшие данные с длинным TTL.
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+        self.enabled = False
+        self._data = {}
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+            return None
+        CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+        return entry[1]
+
+    def set(self, key, value):
+        if self.enabled:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class ChangeListener:
+    """Подписка на канал событий backend в Redis и сброс кэшей бота.
+
+    Каждое событие несёт монотонную версию: если версия пришла с пропуском
+    (события потеряны или было переподключение), кэши очищаются целиком.
+    """
+
+    def __init__(self, redis_url, channel, on_event, caches, reconnect_delay=5):
+        self.redis_url = redis_url
+        self.channel = channel
+        self.on_event = on_event
+        self.caches = caches
+        self.reconnect_delay = reconnect_delay
+        self.last_version = None
+
+    def _set_enabled(self, enabled):
+        for cache in self.caches:
+            cache.clear()
+            cache.enabled = enabled
+
+    async def run(self):
+        while True:
+            client = aioredis.from_url(self.redis_url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self.last_version = None
+                    self._set_enabled(True)
+                    logger.info("change_listener_subscribed channel=%s", self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._handle(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("change_listener_disconnected error=%r", e)
+            finally:
+                self._set_enabled(False)
+                await client.aclose()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _handle(self, data):
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.warning("change_event_invalid data=%r", data)
+            return
+        version = event.get("version")
+        if self.last_version is not None and version is not None and version != self.last_version + 1:
+            logger.info("change_event_gap expected=%s got=%s", self.last_version + 1, version)
+            CACHE_INVALIDATIONS.labels(reason="gap").inc()
+            for cache in self.caches:
+                cache.clear()
+        if version is not None:
+            self.last_version = version
+        self.on_event(event)
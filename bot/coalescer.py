@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from metrics import MUTE_BATCH_SIZE, MUTE_FAILURES
+
+logger = logging.getLogger("bot.coalescer")
+
+
+class MuteCoalescer:
+    """Копит нажатия "Не оповещать" и отправляет их в backend пачками.
+
+    send_batch(ids) выполняется в отдельном потоке и возвращает множество
+    успешно обработанных id; для остальных вызывается on_failure(task_id, targets),
+    где targets - список сообщений с этой задачей: аргументы edit_message_reply_markup
+    ({'chat_id', 'message_id'} или {'inline_message_id'}), None - сообщение недоступно.
+    """
+
+    def __init__(self, send_batch, on_failure, max_batch=100, max_delay=0.5):
+        self.send_batch = send_batch
+        self.on_failure = on_failure
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+
+    def submit(self, task_id, target):
+        self.queue.put_nowait((task_id, target))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = {}
+            task_id, target = await self.queue.get()
+            pending.setdefault(task_id, []).append(target)
+            deadline = loop.time() + self.max_delay
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    task_id, target = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.setdefault(task_id, []).append(target)
+            await self.flush(pending)
+
+    async def flush(self, pending):
+        MUTE_BATCH_SIZE.observe(len(pending))
+        try:
+            muted = await asyncio.to_thread(self.send_batch, list(pending))
+        except Exception as e:
+            logger.error("mute_batch_failed size=%s error=%r", len(pending), e)
+            muted = set()
+        for task_id, targets in pending.items():
+            if task_id in muted:
+                continue
+            MUTE_FAILURES.inc()
+            try:
+                await self.on_failure(task_id, targets)
+            except Exception as e:
+                logger.error("mute_reconcile_failed task_id=%s error=%r", task_id, e)
@@ -1,19 +1,57 @@
 import os
+import re
+import time
 import asyncio
+import hashlib
+import logging
 from aiogram import Bot, Dispatcher, types
-from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.types import Message, InlineQueryResultArticle, InputTextMessageContent
+from aiogram.filters import Command, CommandObject
 from aiogram_dialog import Dialog, Window, DialogManager, StartMode
 from aiogram_dialog.widgets.kbd import Button, Row, Select, Column
 from aiogram_dialog.widgets.text import Const, Format
 from aiogram_dialog.widgets.input import MessageInput
+import msgpack
 import requests
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram_dialog import setup_dialogs
 from datetime import datetime
+from cache import TTLCache, ChangeListener
+from coalescer import MuteCoalescer
+from metrics import (
+    BACKEND_HEALTHY, BACKEND_HEALTH_TRANSITIONS, BACKEND_REQUEST_LATENCY, BACKEND_REQUEST_ERRORS,
+    CACHE_INVALIDATIONS, HandlerTimingMiddleware, UpdatesInFlightMiddleware, timed_getter, start_metrics_server,
+)
 
 API_URL = os.getenv("API_URL", "http://backend:8000/api/")
 BOT_TOKEN = os.getenv("BOT_TOKEN", "test")
+HEALTH_CHECK_INTERVAL = int(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+logging.basicConfig(
+    level=LOG_LEVEL,
+    format="%(asctime)s level=%(levelname)s logger=%(name)s %(message)s",
+)
+logger = logging.getLogger("bot")
+
+# MessagePack, если эндпоинт его поддерживает, иначе любой формат (JSON); сжатие brotli/gzip.
+# Content-Type выставляется только для запросов с телом
+API_HEADERS = {
+    'Accept': 'application/msgpack, */*;q=0.1',
+    'Accept-Encoding': 'br, gzip',
+    'User-Agent': 'TelegramBot/1.0'
+}
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+CHANGE_EVENTS_CHANNEL = os.getenv("CHANGE_EVENTS_CHANNEL", "todo:changes")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+
+# Результат последней фоновой проверки backend (None - проверка ещё не выполнялась)
+api_health = {"healthy": None, "checked_at": None}
+
+# Кэши актуальны, пока бот подписан на события backend (см. on_change_event)
+tasks_cache = TTLCache("tasks", CACHE_TTL)
+categories_cache = TTLCache("categories", CACHE_TTL)
 
 bot = Bot(token=BOT_TOKEN)
 storage = MemoryStorage()
@@ -28,89 +66,287 @@ class MainSG(StatesGroup):
     add_due = State()
     add_category = State()
 
+def api_request(method, path, endpoint, **kwargs):
+    """Запрос к backend с замером времени и подсчётом ошибок по endpoint"""
+    kwargs.setdefault('timeout', 10)
+    headers = API_HEADERS
+    if 'json' in kwargs:
+        kwargs['data'] = msgpack.packb(kwargs.pop('json'), use_bin_type=True)
+        headers = {**API_HEADERS, 'Content-Type': 'application/msgpack'}
+    start = time.perf_counter()
+    try:
+        resp = requests.request(method, f"{API_URL}{path}", headers=headers, **kwargs)
+    except Exception as e:
+        BACKEND_REQUEST_ERRORS.labels(endpoint=endpoint, reason=type(e).__name__).inc()
+        raise
+    finally:
+        BACKEND_REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(time.perf_counter() - start)
+    if resp.status_code >= 400:
+        BACKEND_REQUEST_ERRORS.labels(endpoint=endpoint, reason=str(resp.status_code)).inc()
+    logger.debug(
+        "backend_request method=%s endpoint=%s status=%s duration_ms=%.1f",
+        method, endpoint, resp.status_code, resp.elapsed.total_seconds() * 1000,
+    )
+    return resp
+
+def response_data(resp):
+    """Тело ответа backend: MessagePack или JSON в зависимости от Content-Type"""
+    if resp.headers.get('Content-Type', '').startswith('application/msgpack'):
+        return msgpack.unpackb(resp.content, raw=False)
+    return resp.json()
+
+def response_error(resp):
+    try:
+        data = response_data(resp)
+    except ValueError:
+        return resp.text
+    return data.get('error', data) if isinstance(data, dict) else data
+
 def get_or_create_profile(telegram_id, telegram_username, first_name, last_name):
     try:
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'User-Agent': 'TelegramBot/1.0'
-        }
-        resp = requests.post(f"{API_URL}profiles/", json={
+        resp = api_request("POST", "profiles/", "profiles_create", json={
             "telegram_id": telegram_id,
             "telegram_username": telegram_username,
             "first_name": first_name,
             "last_name": last_name,
-        }, headers=headers, timeout=10)
+        })
         if resp.status_code in (200, 201):
-            return resp.json()["id"]
+            return response_data(resp)["id"]
         else:
-            print(f"Failed to create profile: status {resp.status_code}")
+            logger.warning("profile_create_failed status=%s", resp.status_code)
     except Exception as e:
-        print(f"Error creating profile: {e}")
+        logger.error("profile_create_error error=%r", e)
     return None
 
+QUICK_ADD_USAGE = (
+    "Формат: /add заголовок #категория @YYYY-MM-DD HH:MM *weekly -- описание\n"
+    "Категории, повторение (*daily, *weekly, *monthly, *weekly/2 - раз в две недели) "
+    "и описание необязательны."
+)
+QUICK_ADD_DUE_RE = re.compile(r'@(\d{4}-\d{2}-\d{2} \d{2}:\d{2})')
+QUICK_ADD_CATEGORY_RE = re.compile(r'#(\S+)')
+QUICK_ADD_DESC_RE = re.compile(r'(?:^|\s)--(?:\s|$)')
+QUICK_ADD_REPEAT_RE = re.compile(r'\*(daily|weekly|monthly)(?:/(\d+))?(?=\s|$)')
+RECURRENCE_LABELS = {"daily": "ежедневно", "weekly": "еженедельно", "monthly": "ежемесячно"}
+
+def parse_quick_add(text):
+    """Разбор строки вида 'заголовок #категория @YYYY-MM-DD HH:MM -- описание'"""
+    parts = QUICK_ADD_DESC_RE.split(text or '', maxsplit=1)
+    head = parts[0]
+    description = parts[1].strip() if len(parts) > 1 else ''
+    due_match = QUICK_ADD_DUE_RE.search(head)
+    if not due_match:
+        return None
+    try:
+        datetime.strptime(due_match.group(1), '%Y-%m-%d %H:%M')
+    except ValueError:
+        return None
+    head = QUICK_ADD_DUE_RE.sub(' ', head)
+    repeat_match = QUICK_ADD_REPEAT_RE.search(head)
+    head = QUICK_ADD_REPEAT_RE.sub(' ', head)
+    category_names = QUICK_ADD_CATEGORY_RE.findall(head)
+    title = ' '.join(QUICK_ADD_CATEGORY_RE.sub(' ', head).split())
+    if not title:
+        return None
+    task_data = {
+        "title": title,
+        "description": description,
+        "category_names": category_names,
+        "due_date": due_match.group(1),
+    }
+    if repeat_match:
+        task_data["recurrence_freq"] = repeat_match.group(1)
+        task_data["recurrence_interval"] = int(repeat_match.group(2) or 1)
+    return task_data
+
+def quick_add_task(user, task_data):
+    """Создание задачи одним запросом к backend (вместе с профилем)"""
+    try:
+        resp = api_request("POST", "tasks/quick_add/", "tasks_quick_add", json={
+            "telegram_id": user.id,
+            "telegram_username": user.username,
+            "first_name": user.first_name or "",
+            "last_name": user.last_name or "",
+            **task_data,
+        })
+        if resp.status_code in (200, 201):
+            tasks_cache.invalidate(user.id)
+            return True, None
+        return False, response_error(resp)
+    except Exception as e:
+        return False, str(e)
+
+REMINDERS_USAGE = (
+    "Формат: /reminders 1440 60 10 - напоминать за сутки, за час и за 10 минут до дедлайна.\n"
+    "Без аргументов показывает текущие пороги."
+)
+
+def format_offsets(offsets):
+    parts = []
+    for minutes in offsets:
+        if minutes % 1440 == 0:
+            parts.append(f"{minutes // 1440} д")
+        elif minutes % 60 == 0:
+            parts.append(f"{minutes // 60} ч")
+        else:
+            parts.append(f"{minutes} мин")
+    return ", ".join(parts) or "не заданы"
+
+def reminder_offsets(user, offsets=None):
+    """Пороги напоминаний профиля; с offsets - сохранить новые. Возвращает (пороги, ошибка)"""
+    try:
+        profile_id = get_or_create_profile(user.id, user.username, user.first_name or "", user.last_name or "")
+        if profile_id is None:
+            return None, "профиль недоступен"
+        if offsets is None:
+            resp = api_request("GET", f"profiles/{profile_id}/", "profiles_get", params={"fields": "reminder_offsets"})
+        else:
+            resp = api_request("PATCH", f"profiles/{profile_id}/", "profiles_update", json={"reminder_offsets": offsets})
+        if resp.status_code == 200:
+            return response_data(resp)["reminder_offsets"], None
+        return None, response_error(resp)
+    except Exception as e:
+        return None, str(e)
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+def get_week_agenda(telegram_id):
+    """Задачи текущей недели по дням (счётчики и первые задачи дня считает backend)"""
+    try:
+        resp = api_request("GET", "tasks/calendar/", "tasks_calendar", params={
+            "telegram_id": telegram_id,
+            "week": "{}-W{:02d}".format(*datetime.now().isocalendar()[:2]),
+        })
+        if resp.status_code == 200:
+            return response_data(resp)
+        logger.warning("tasks_calendar_failed status=%s", resp.status_code)
+    except Exception as e:
+        logger.error("tasks_calendar_error error=%r", e)
+    return None
+
+def format_week_agenda(agenda):
+    lines = []
+    for day in agenda["days"]:
+        if not day["total"]:
+            continue
+        weekday = WEEKDAYS[datetime.strptime(day["date"], "%Y-%m-%d").weekday()]
+        header = f"{weekday} {day['date']}: задач {day['total']}"
+        if day["overdue"]:
+            header += f", просрочено {day['overdue']}"
+        lines.append(header)
+        for task in day["tasks"]:
+            mark = "✅" if task["is_completed"] else "•"
+            lines.append(f"  {mark} {task['due_date'][11:]} {task['title']}")
+        hidden = day["total"] - len(day["tasks"])
+        if hidden > 0:
+            lines.append(f"  ... и ещё {hidden}")
+    return "\n".join(lines) or "На этой неделе задач нет"
+
+# Поля, которые нужны show_tasks: остальные backend не вычисляет и не передаёт
+TASK_LIST_FIELDS = (
+    "id,title,description,created_at,due_date,category_names,recurrence_freq,recurrence_interval,"
+    "parent,progress"
+)
+
+def order_task_tree(tasks):
+    """Задачи в порядке обхода дерева: подзадачи сразу после родителя, (задача, уровень)"""
+    ids = {t.get("id") for t in tasks}
+    children = {}
+    roots = []
+    for t in tasks:
+        # Родителя может не быть в списке (например, он в архиве) - тогда задача в корне
+        if t.get("parent") in ids:
+            children.setdefault(t["parent"], []).append(t)
+        else:
+            roots.append(t)
+    ordered = []
+    stack = [(t, 0) for t in reversed(roots)]
+    while stack:
+        t, level = stack.pop()
+        ordered.append((t, level))
+        stack.extend((child, level + 1) for child in reversed(children.get(t.get("id"), [])))
+    return ordered
+
 def get_tasks(telegram_id):
+    cached = tasks_cache.get(telegram_id)
+    if cached is not None:
+        return cached
     try:
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'User-Agent': 'TelegramBot/1.0'
-        }
-        resp = requests.get(f"{API_URL}tasks/?telegram_id={telegram_id}", headers=headers, timeout=10)
+        resp = api_request("GET", "tasks/", "tasks_list", params={"telegram_id": telegram_id, "fields": TASK_LIST_FIELDS})
         if resp.status_code == 200:
-            data = resp.json()
+            data = response_data(resp)
             if isinstance(data, dict) and 'results' in data:
+                tasks_cache.set(telegram_id, data['results'])
                 return data['results']
             elif isinstance(data, list):
+                tasks_cache.set(telegram_id, data)
                 return data
             else:
-                print(f"Unexpected API response format: {type(data)}")
+                logger.warning("tasks_unexpected_format type=%s", type(data).__name__)
                 return []
         else:
-            print(f"Failed to get tasks: status {resp.status_code}")
+            logger.warning("tasks_list_failed status=%s", resp.status_code)
     except Exception as e:
-        print(f"Error getting tasks: {e}")
+        logger.error("tasks_list_error error=%r", e)
     return []
 
 def check_api_health():
     try:
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'User-Agent': 'TelegramBot/1.0'
-        }
-        resp = requests.get(f"{API_URL}categories/", headers=headers, timeout=5)
-        print(f"API health check: status={resp.status_code}")
+        resp = api_request("GET", "health/", "health", timeout=5)
         if resp.status_code == 200:
-            try:
-                data = resp.json()
-                print(f"API health check: received {len(data)} categories")
-                return True
-            except:
-                print("API health check: invalid JSON response")
-                return False
-        else:
-            print(f"API health check: status {resp.status_code}")
-            return False
+            return True
+        logger.warning("api_health_check status=%s", resp.status_code)
+        return False
     except Exception as e:
-        print(f"API health check failed: {e}")
+        logger.warning("api_health_check_failed error=%r", e)
         return False
 
+async def health_probe_loop():
+    """Фоновая проверка backend: /start читает закэшированный результат"""
+    while True:
+        healthy = await asyncio.to_thread(check_api_health)
+        if healthy != api_health["healthy"]:
+            logger.info("api_health_changed previous=%s current=%s", api_health["healthy"], healthy)
+            BACKEND_HEALTH_TRANSITIONS.labels(state="healthy" if healthy else "unhealthy").inc()
+        api_health["healthy"] = healthy
+        api_health["checked_at"] = datetime.now()
+        BACKEND_HEALTHY.set(1 if healthy else 0)
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+def on_change_event(event):
+    """Сброс кэшей по событию об изменении на стороне backend"""
+    kind = event.get("kind", "")
+    if kind.startswith("category."):
+        # Названия категорий есть в списках задач всех пользователей
+        categories_cache.clear()
+        tasks_cache.clear()
+    elif event.get("telegram_id") is not None:
+        tasks_cache.invalidate(event["telegram_id"])
+    else:
+        tasks_cache.clear()
+    CACHE_INVALIDATIONS.labels(reason=kind.split(".")[0] or "unknown").inc()
+
+change_listener = ChangeListener(REDIS_URL, CHANGE_EVENTS_CHANNEL, on_change_event, [tasks_cache, categories_cache])
+
 async def on_start(m: Message, dialog_manager: DialogManager):
-    if not check_api_health():
+    if api_health["healthy"] is False:
         await m.answer("⚠️ Внимание: API недоступен. Некоторые функции могут не работать.")
     await dialog_manager.start(MainSG.main, mode=StartMode.RESET_STACK)
 
+@timed_getter
 async def show_tasks(dialog_manager: DialogManager, **kwargs):
     telegram_id = dialog_manager.event.from_user.id
     tasks = get_tasks(telegram_id)
     if not tasks:
         return {"tasks": "Нет задач"}
     lines = []
+    valid = []
     for t in tasks:
         if not isinstance(t, dict):
-            print(f"Task is not a dict: {type(t)}, value: {t}")
+            logger.warning("task_not_a_dict type=%s", type(t).__name__)
             continue
+        valid.append(t)
+    for t, level in order_task_tree(valid):
         created_at = t.get('created_at', '')
         if created_at:
             try:
@@ -129,7 +365,7 @@ async def show_tasks(dialog_manager: DialogManager, **kwargs):
                 due_str = due_date[:16]
         else:
             due_str = 'Дедлайн не указан'
-        cats = t.get("categories", [])
+        cats = t.get("category_names") or t.get("categories", [])
         if cats:
             if isinstance(cats[0], dict):
                 cats_str = ", ".join(c.get("name", str(c)) for c in cats if c.get("name"))
@@ -140,7 +376,21 @@ async def show_tasks(dialog_manager: DialogManager, **kwargs):
         desc = t.get("description", "")
         if not desc:
             desc = "Описание отсутствует"
-        lines.append(f"Создана: {created_str}\n{t['title']}\nОписание: {desc}\nКатегории: {cats_str}\nДедлайн: {due_str}")
+        line = f"Создана: {created_str}\n{t['title']}\nОписание: {desc}\nКатегории: {cats_str}\nДедлайн: {due_str}"
+        freq = t.get("recurrence_freq")
+        if freq:
+            repeat_str = RECURRENCE_LABELS.get(freq, freq)
+            interval = t.get("recurrence_interval") or 1
+            if interval > 1:
+                repeat_str += f", шаг {interval}"
+            line += f"\n🔁 Повторяется: {repeat_str}"
+        progress = t.get("progress")
+        if progress:
+            line += f"\n☑️ Подзадачи: {progress['done']}/{progress['total']} ({progress['percent']}%)"
+        if level:
+            indent = "    " * level
+            line = indent + "↳ " + line.replace("\n", "\n" + indent + "  ")
+        lines.append(line)
     return {"tasks": "\n\n".join(lines)}
 
 async def on_title_message(message: Message, widget, manager: DialogManager):
@@ -183,65 +433,54 @@ async def on_due_message(message: Message, widget, manager: DialogManager):
     }
 
     try:
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'User-Agent': 'TelegramBot/1.0'
-        }
-        resp = requests.post(f"{API_URL}tasks/", json=data, headers=headers, timeout=10)
+        resp = api_request("POST", "tasks/", "tasks_create", json=data)
         if resp.status_code in (200, 201):
+            tasks_cache.invalidate(telegram_id)
             await message.answer("Задача добавлена!")
         else:
-            await message.answer(f"Ошибка при добавлении задачи: {resp.text}")
+            await message.answer(f"Ошибка при добавлении задачи: {response_error(resp)}")
     except Exception as e:
         await message.answer(f"Ошибка при добавлении задачи: {e}")
 
     await manager.switch_to(MainSG.main)
 
+@timed_getter
 async def get_categories(dialog_manager: DialogManager, **kwargs):
+    cached = categories_cache.get("all")
+    if cached is not None:
+        return {"categories": cached}
     try:
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'User-Agent': 'TelegramBot/1.0'
-        }
-        url = f"{API_URL}categories/"
-        print(f"Requesting categories from: {url}")
-
-        resp = requests.get(url, headers=headers, timeout=10)
-        print(f"Response status: {resp.status_code}")
-        print(f"Response headers: {dict(resp.headers)}")
-        print(f"Response content (first 200 chars): {resp.text[:200]}")
+        resp = api_request("GET", "categories/", "categories_list")
+        logger.debug("categories_response status=%s body=%r", resp.status_code, resp.content[:200])
 
         if resp.status_code == 200:
             try:
-                data = resp.json()
-                print(f"Parsed categories: {data}")
+                data = response_data(resp)
 
                 if isinstance(data, dict) and 'results' in data:
                     cats = data['results']
                 elif isinstance(data, list):
                     cats = data
                 else:
-                    print(f"Unexpected categories response format: {type(data)}")
+                    logger.warning("categories_unexpected_format type=%s", type(data).__name__)
                     cats = []
 
                 if isinstance(cats, list) and len(cats) > 0:
                     result = [(c["id"], c["name"]) for c in cats if "id" in c and "name" in c]
-                    print(f"Formatted categories: {result}")
+                    logger.debug("categories_parsed count=%s", len(result))
+                    categories_cache.set("all", result)
                     return {"categories": result}
                 else:
-                    print("Categories list is empty")
+                    logger.warning("categories_empty")
             except Exception as json_error:
-                print(f"JSON parsing error: {json_error}")
-                print(f"Response text: {resp.text}")
+                logger.error("categories_json_error error=%r body=%r", json_error, resp.content[:200])
         else:
-            print(f"API returned status {resp.status_code}")
+            logger.warning("categories_list_failed status=%s", resp.status_code)
 
     except Exception as e:
-        print(f"Request error: {e}")
+        logger.error("categories_list_error error=%r", e)
 
-    print("Using fallback categories")
+    logger.warning("categories_fallback")
     return {"categories": [("test_id", "Test Category")]}
 
 add_title_window = Window(
@@ -294,39 +533,146 @@ def register_handlers(dp: Dispatcher):
     async def cmd_start(m: Message, dialog_manager: DialogManager):
         await on_start(m, dialog_manager)
 
+    @dp.message(Command("add"))
+    async def cmd_add(m: Message, command: CommandObject):
+        task_data = parse_quick_add(command.args)
+        if not task_data:
+            await m.answer(QUICK_ADD_USAGE)
+            return
+        ok, error = quick_add_task(m.from_user, task_data)
+        if ok:
+            await m.answer(f"Задача добавлена: {task_data['title']}")
+        else:
+            await m.answer(f"Ошибка при добавлении задачи: {error}")
+
+    @dp.message(Command("week"))
+    async def cmd_week(m: Message):
+        agenda = get_week_agenda(m.from_user.id)
+        if agenda is None:
+            await m.answer("Не удалось получить задачи недели. Попробуйте /start")
+            return
+        await m.answer(format_week_agenda(agenda))
+
+    @dp.message(Command("reminders"))
+    async def cmd_reminders(m: Message, command: CommandObject):
+        offsets = None
+        if command.args:
+            try:
+                offsets = [int(value) for value in command.args.replace(',', ' ').split()]
+            except ValueError:
+                await m.answer(REMINDERS_USAGE)
+                return
+        current, error = reminder_offsets(m.from_user, offsets)
+        if error:
+            await m.answer(f"Ошибка: {error}")
+            return
+        await m.answer(f"Напоминания до дедлайна: {format_offsets(current)}")
+
+    @dp.inline_query()
+    async def inline_add(inline_query: types.InlineQuery):
+        task_data = parse_quick_add(inline_query.query)
+        if not task_data:
+            await inline_query.answer([], cache_time=0, is_personal=True)
+            return
+        cats_str = ", ".join(task_data["category_names"]) or "Не указана"
+        text = (
+            f"Задача: {task_data['title']}\n"
+            f"Категории: {cats_str}\n"
+            f"Дедлайн: {task_data['due_date']}"
+        )
+        result = InlineQueryResultArticle(
+            id=hashlib.md5(inline_query.query.encode()).hexdigest(),
+            title=f"Добавить задачу: {task_data['title']}",
+            description=f"{cats_str} · {task_data['due_date']}",
+            input_message_content=InputTextMessageContent(message_text=text),
+        )
+        await inline_query.answer([result], cache_time=0, is_personal=True)
+
+    @dp.chosen_inline_result()
+    async def inline_add_chosen(chosen: types.ChosenInlineResult):
+        # Задача создаётся только после выбора результата пользователем
+        task_data = parse_quick_add(chosen.query)
+        if not task_data:
+            return
+        ok, error = quick_add_task(chosen.from_user, task_data)
+        if not ok:
+            await bot.send_message(chosen.from_user.id, f"Ошибка при добавлении задачи: {error}")
+
     @dp.callback_query(lambda c: c.data and c.data.startswith('disable_notifications:'))
     async def handle_disable_notifications(callback_query: types.CallbackQuery):
         await handle_callback_query(callback_query)
 
+def mute_tasks(task_ids):
+    """Пакетное отключение уведомлений; возвращает множество обработанных id"""
+    resp = api_request("POST", "tasks/bulk_mute/", "tasks_bulk_mute", json={"ids": task_ids})
+    resp.raise_for_status()
+    return set(response_data(resp).get("muted", []))
+
+def mute_keyboard(task_id, text):
+    return types.InlineKeyboardMarkup(inline_keyboard=[[
+        types.InlineKeyboardButton(text=text, callback_data=f"disable_notifications:{task_id}")
+    ]])
+
+async def on_mute_failed(task_id, targets):
+    # Кнопка уже убрана оптимистично - возвращаем её, чтобы можно было повторить
+    for target in targets:
+        if target is None:
+            continue
+        await bot.edit_message_reply_markup(
+            **target,
+            reply_markup=mute_keyboard(task_id, "⚠️ Не удалось отключить, повторить"),
+        )
+
+mute_coalescer = MuteCoalescer(mute_tasks, on_mute_failed)
+
+def callback_target(callback_query: types.CallbackQuery):
+    """Сообщение с кнопкой для edit_message_reply_markup или None, если его не изменить.
+
+    Для inline-результатов message нет - есть только inline_message_id; слишком
+    старое сообщение приходит как InaccessibleMessage, редактировать его нельзя.
+    """
+    message = callback_query.message
+    if isinstance(message, Message):
+        return {'chat_id': message.chat.id, 'message_id': message.message_id}
+    if callback_query.inline_message_id:
+        return {'inline_message_id': callback_query.inline_message_id}
+    return None
+
 async def handle_callback_query(callback_query: types.CallbackQuery):
     try:
         if callback_query.data.startswith('disable_notifications:'):
             task_id = callback_query.data.split(':')[1]
-
-            headers = {
-                'Accept': 'application/json',
-                'Content-Type': 'application/json',
-                'User-Agent': 'TelegramBot/1.0'
-            }
-            data = {'notifications_disabled': True}
-
-            resp = requests.patch(f"{API_URL}tasks/{task_id}/", json=data, headers=headers, timeout=10)
-
-            if resp.status_code == 200:
-                await callback_query.answer("🔕 Уведомления для этой задачи отключены!")
-                await callback_query.message.edit_reply_markup(reply_markup=None)
-            else:
-                await callback_query.answer("❌ Ошибка при отключении уведомлений")
+            # Отвечаем сразу, запрос в backend уходит в фоне пачкой
+            await callback_query.answer("🔕 Уведомления для этой задачи отключены!")
+            target = callback_target(callback_query)
+            mute_coalescer.submit(task_id, target)
+            if target is not None:
+                await bot.edit_message_reply_markup(**target, reply_markup=None)
 
     except Exception as e:
-        print(f"Error handling callback query: {e}")
-        await callback_query.answer("❌ Произошла ошибка")
+        logger.error("callback_query_error data=%r error=%r", callback_query.data, e)
+
+def register_middlewares(dp: Dispatcher):
+    dp.update.outer_middleware(UpdatesInFlightMiddleware())
+    for event_type in ("message", "callback_query", "inline_query", "chosen_inline_result"):
+        dp.observers[event_type].middleware(HandlerTimingMiddleware(event_type))
 
 async def main():
+    register_middlewares(dp)
     register_handlers(dp)
     setup_dialogs(dp)
     dp.include_routers(dialog)
-    await dp.start_polling(bot)
+    start_metrics_server()
+    background = [
+        asyncio.create_task(health_probe_loop()),
+        asyncio.create_task(mute_coalescer.run()),
+        asyncio.create_task(change_listener.run()),
+    ]
+    try:
+        await dp.start_polling(bot)
+    finally:
+        for task in background:
+            task.cancel()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,125 @@
+import os
+import time
+import functools
+from aiogram import BaseMiddleware
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+BACKEND_HEALTHY = Gauge(
+    "bot_backend_healthy",
+    "1 если последняя проверка /api/health/ успешна, иначе 0",
+)
+BACKEND_HEALTH_TRANSITIONS = Counter(
+    "bot_backend_health_transitions_total",
+    "Переходы состояния backend между healthy и unhealthy",
+    ["state"],
+)
+BACKEND_REQUEST_LATENCY = Histogram(
+    "bot_backend_request_seconds",
+    "Время запросов к backend",
+    ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+BACKEND_REQUEST_ERRORS = Counter(
+    "bot_backend_request_errors_total",
+    "Ошибки запросов к backend (HTTP-статус >= 400 или имя исключения)",
+    ["endpoint", "reason"],
+)
+HANDLER_LATENCY = Histogram(
+    "bot_handler_seconds",
+    "Время выполнения обработчиков aiogram",
+    ["event", "handler"],
+    buckets=LATENCY_BUCKETS,
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total",
+    "Исключения в обработчиках aiogram",
+    ["event", "handler"],
+)
+GETTER_LATENCY = Histogram(
+    "bot_dialog_getter_seconds",
+    "Время выполнения getter'ов aiogram-dialog",
+    ["getter"],
+    buckets=LATENCY_BUCKETS,
+)
+UPDATES_IN_FLIGHT = Gauge(
+    "bot_updates_in_flight",
+    "Апдейты Telegram, которые сейчас обрабатываются (глубина очереди)",
+)
+UPDATE_LATENCY = Histogram(
+    "bot_update_seconds",
+    "Полное время обработки апдейта Telegram",
+    buckets=LATENCY_BUCKETS,
+)
+MUTE_BATCH_SIZE = Histogram(
+    "bot_mute_batch_size",
+    "Число задач в одном пакетном запросе на отключение уведомлений",
+    buckets=(1, 2, 5, 10, 25, 50, 100),
+)
+MUTE_FAILURES = Counter(
+    "bot_mute_failures_total",
+    "Задачи, для которых не удалось отключить уведомления",
+)
+CACHE_REQUESTS = Counter(
+    "bot_cache_requests_total",
+    "Обращения к кэшам бота",
+    ["cache", "result"],
+)
+CACHE_INVALIDATIONS = Counter(
+    "bot_cache_invalidations_total",
+    "Сбросы кэшей бота по событиям backend",
+    ["reason"],
+)
+
+
+class UpdatesInFlightMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: число апдейтов в обработке и общее время"""
+
+    async def __call__(self, handler, event, data):
+        UPDATES_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_LATENCY.observe(time.perf_counter() - start)
+            UPDATES_IN_FLIGHT.dec()
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Inner-middleware: время и ошибки конкретного обработчика"""
+
+    def __init__(self, event_type):
+        self.event_type = event_type
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(event=self.event_type, handler=name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(event=self.event_type, handler=name).observe(time.perf_counter() - start)
+
+
+def timed_getter(func):
+    """Декоратор для getter'ов окон aiogram-dialog"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            GETTER_LATENCY.labels(getter=func.__name__).observe(time.perf_counter() - start)
+    return wrapper
+
+
+def start_metrics_server():
+    """Запуск HTTP-эндпоинта с метриками в формате Prometheus (METRICS_PORT=0 отключает)"""
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)